@@ -1,40 +1,26 @@
 """
 Клиент API EMS. Дати зберігаються як dd-mm-yyyy; при парсингу з API якщо є лише dd-mm — підставляється поточний рік.
+Постійний HTTP-клієнт (keep-alive, HTTP/2 при наявності h2), умовні запити з ETag/Last-Modified,
+потоковий розбір JSON-масиву, завантаження вікна дат паралельними сторінками.
 """
-import re
-from datetime import datetime
+import asyncio
+import importlib.util
+import json
+import time
+from datetime import date, timedelta
 import httpx
-from config import EMS_API_URL, EMS_API_KEY
-
-
-def normalize_date_to_ddmmyyyy(value: str, default_year: int | None = None) -> str:
-    """Привести дату з API до dd-mm-yyyy. Якщо рік не заданий — default_year (за замовчуванням поточний)."""
-    if not value or not isinstance(value, str):
-        return ""
-    value = value.strip()
-    year = default_year if default_year is not None else datetime.now().year
-    # Вже dd-mm-yyyy
-    m = re.match(r"^(\d{1,2})-(\d{1,2})-(\d{4})$", value)
-    if m:
-        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{m.group(3)}"
-    # dd-mm або d-m — додати рік
-    m = re.match(r"^(\d{1,2})-(\d{1,2})$", value)
-    if m:
-        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{year}"
-    # ISO: 2025-02-12
-    m = re.match(r"^(\d{4})-(\d{1,2})-(\d{1,2})", value)
-    if m:
-        return f"{int(m.group(3)):02d}-{int(m.group(2)):02d}-{m.group(1)}"
-    # 12.02.2025 або 12.02
-    m = re.match(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?$", value)
-    if m:
-        y = m.group(3) if m.group(3) else str(year)
-        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{y}"
-    # 12/02/2025
-    m = re.match(r"^(\d{1,2})/(\d{1,2})/(\d{4})", value)
-    if m:
-        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{m.group(3)}"
-    return value
+from config import (
+    EMS_API_URL,
+    EMS_API_KEY,
+    FETCH_TIMEOUT,
+    FETCH_WINDOW_DAYS_BACK,
+    FETCH_WINDOW_DAYS_AHEAD,
+    FETCH_PAGE_DAYS,
+    FETCH_CONCURRENCY,
+)
+from database import get_http_validators
+from metrics import FETCH_DURATION, FETCH_PAGES, FETCH_BYTES
+
 
 # Мок-данные для разработки (когда API ещё нет)
 MOCK_SHIFTS = [
@@ -50,39 +36,212 @@ MOCK_SHIFTS = [
 ]
 
 
-async def fetch_shifts_from_api() -> list[dict] | None:
+# HTTP/2 — лише якщо встановлено пакет h2 (pip install httpx[http2])
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Один клієнт на процес: keep-alive між завантаженнями, HTTP/2 де доступно."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=FETCH_TIMEOUT,
+            http2=_HTTP2,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=600),
+        )
+    return _client
+
+
+async def close_client():
+    """Закрити HTTP-клієнт при зупинці бота."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class JsonArrayStream:
+    """Інкрементальний парсер JSON-масиву: feed(шматок тексту) → готові елементи.
+    Масив — перший «[» у відповіді (підходить і для [...], і для {"shifts": [...]})."""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._started = False
+        self.finished = False
+
+    def feed(self, text: str) -> list:
+        items = []
+        buf = self._buf + text
+        pos = 0
+        if not self._started:
+            pos = buf.find("[")
+            if pos < 0:
+                self._buf = ""
+                return items
+            self._started = True
+            pos += 1
+        n = len(buf)
+        while not self.finished:
+            while pos < n and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= n:
+                break
+            if buf[pos] == "]":
+                self.finished = True
+                pos += 1
+                break
+            try:
+                item, pos = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # елемент ще не дочитано — чекаємо наступний шматок
+            items.append(item)
+        self._buf = buf[pos:]
+        return items
+
+
+def _row_from_item(item: dict) -> dict:
+    # Дату нормалізує до dd-mm-yyyy database.sync_shifts (пачкою по колонці), тут — як є з API
+    return {
+        "date_ddmm": item.get("date_ddmm", item.get("date", "")),
+        "fio": item.get("fio", item.get("name", "")),
+        "shift_type": str(item.get("shift_type", item.get("shift", ""))),
+        "location": item.get("location", item.get("place", "")),
+    }
+
+
+def fetch_windows(today: date | None = None) -> list[tuple[date, date]] | None:
+    """Сторінки вікна [сьогодні - BACK, сьогодні + AHEAD] по FETCH_PAGE_DAYS днів (включно).
+    Межі вирівняні за номером дня від епохи — URL сторінок стабільні між днями, ETag спрацьовує.
+    None — вікно вимкнене (FETCH_WINDOW_DAYS_AHEAD=0), весь набір одним запитом."""
+    if FETCH_WINDOW_DAYS_AHEAD <= 0:
+        return None
+    today = today or date.today()
+    page = max(1, FETCH_PAGE_DAYS)
+    first = (today - timedelta(days=FETCH_WINDOW_DAYS_BACK)).toordinal()
+    last = (today + timedelta(days=FETCH_WINDOW_DAYS_AHEAD)).toordinal()
+    start = first - first % page
+    windows = []
+    while start <= last:
+        windows.append((date.fromordinal(start), date.fromordinal(start + page - 1)))
+        start += page
+    return windows
+
+
+class ShiftFetch:
+    """Завантаження змін: асинхронний ітератор пачок рядків (date_ddmm, fio, shift_type, location).
+    Сторінки качаються паралельно (не більше FETCH_CONCURRENCY) і віддаються по мірі розбору.
+
+    Після вичитування scope — множина дат dd-mm-yyyy, які API віддав повністю (відповідь 200),
+    або None, якщо отримано весь набір. Дати сторінок з 304 чи помилкою в scope не входять —
+    синхронізація не видаляє там нічого (database.sync_shifts).
+
+    validators — {url: (ETag, Last-Modified)} сторінок з 200; зберігаються в БД лише в транзакції
+    sync_shifts, разом з даними: якщо процес впаде до COMMIT, наступний запит буде повним, а не 304."""
+
+    CHUNK_ROWS = 1000
+
+    def __init__(self):
+        self.scope: set[str] | None = set()
+        self.pages = 0
+        self.not_modified = 0
+        self.failed = 0
+        self.bytes = 0
+        self.validators: dict[str, tuple[str | None, str | None]] = {}
+        self.received = 0  # сторінок з відповіддю 200; 0 — даних немає (усі 304 / помилки), синхронізувати нічого
+
+    def _headers(self) -> dict:
+        headers = {}
+        if EMS_API_KEY:
+            headers["Authorization"] = f"Bearer {EMS_API_KEY}"
+            # или headers["X-API-Key"] = EMS_API_KEY
+        return headers
+
+    async def _fetch_page(self, window: tuple[date, date] | None, sem: asyncio.Semaphore, out: asyncio.Queue):
+        """Одна сторінка: умовний запит, потоковий розбір, пачки рядків у чергу out."""
+        # Подставь нужный метод, путь и параметры когда API будет готов
+        url = f"{EMS_API_URL.rstrip('/')}/shifts"
+        if window:
+            url += f"?date_from={window[0].isoformat()}&date_to={window[1].isoformat()}"
+        headers = self._headers()
+        validators = await get_http_validators(url)
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        async with sem:
+            try:
+                async with get_client().stream("GET", url, headers=headers) as resp:
+                    if resp.status_code == 304:
+                        self.not_modified += 1
+                        FETCH_PAGES.inc("304")
+                        return
+                    resp.raise_for_status()
+                    # Масив розбираємо по мірі надходження, не тримаючи всю відповідь у памʼяті
+                    parser = JsonArrayStream()
+                    chunk = []
+                    async for text in resp.aiter_text():
+                        chunk.extend(_row_from_item(item) for item in parser.feed(text))
+                        if len(chunk) >= self.CHUNK_ROWS:
+                            await out.put(chunk)
+                            chunk = []
+                    if not parser.finished:
+                        raise ValueError("Неповна JSON-відповідь від API")
+                    if chunk:
+                        await out.put(chunk)
+                    self.bytes += resp.num_bytes_downloaded
+                    FETCH_PAGES.inc(str(resp.status_code))
+                    FETCH_BYTES.inc(amount=resp.num_bytes_downloaded)
+                    self.validators[url] = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                    self.received += 1
+            except Exception as e:
+                self.failed += 1
+                FETCH_PAGES.inc("error")
+                print(f"[EMS] Помилка завантаження {url}: {e}")
+                return
+        if window is None:
+            self.scope = None
+        else:
+            day = window[0]
+            while day <= window[1]:
+                self.scope.add(day.strftime("%d-%m-%Y"))
+                day += timedelta(days=1)
+
+    async def __aiter__(self):
+        if not EMS_API_URL or "example.com" in EMS_API_URL:
+            # Реального API нет — мок, как весь набор
+            self.scope = None
+            self.received = 1
+            yield MOCK_SHIFTS.copy()
+            return
+        windows = fetch_windows() or [None]
+        self.pages = len(windows)
+        sem = asyncio.Semaphore(max(1, FETCH_CONCURRENCY))
+        out: asyncio.Queue = asyncio.Queue(maxsize=FETCH_CONCURRENCY * 4)
+        tasks = [asyncio.create_task(self._fetch_page(w, sem, out)) for w in windows]
+        done = asyncio.gather(*tasks)
+        started = time.perf_counter()
+        try:
+            while not (done.done() and out.empty()):
+                getter = asyncio.ensure_future(out.get())
+                await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            FETCH_DURATION.observe(time.perf_counter() - started)
+
+
+def fetch_shifts_from_api() -> ShiftFetch:
     """
-    Загрузить смены с API EMS.
-    Возвращает список dict: date_ddmm, fio, shift_type, location.
-    При ошибке или отсутствии API возвращает None (можно подставить мок).
+    Загрузить смены с API EMS (окном по FETCH_WINDOW_* или целиком).
+    Возвращает ShiftFetch — пачки dict: date_ddmm, fio, shift_type, location — для database.sync_shifts.
+    Сторінки з помилкою не підміняються моком і не чіпають наявні дані.
     """
-    if not EMS_API_URL or "example.com" in EMS_API_URL:
-        # Реального API нет — возвращаем мок
-        return MOCK_SHIFTS.copy()
-
-    headers = {}
-    if EMS_API_KEY:
-        headers["Authorization"] = f"Bearer {EMS_API_KEY}"
-        # или headers["X-API-Key"] = EMS_API_KEY
-
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Подставь нужный метод и путь когда API будет готов
-            resp = await client.get(
-                f"{EMS_API_URL.rstrip('/')}/shifts",
-                headers=headers,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            # Зберігаємо дати як dd-mm-yyyy; якщо API віддає тільки dd-mm — підставляємо поточний рік
-            return [
-                {
-                    "date_ddmm": normalize_date_to_ddmmyyyy(item.get("date_ddmm", item.get("date", ""))),
-                    "fio": item.get("fio", item.get("name", "")),
-                    "shift_type": str(item.get("shift_type", item.get("shift", ""))),
-                    "location": item.get("location", item.get("place", "")),
-                }
-                for item in (data if isinstance(data, list) else data.get("shifts", []))
-            ]
-    except Exception:
-        return MOCK_SHIFTS.copy()
+    return ShiftFetch()
@@ -0,0 +1,93 @@
+"""Відправка повідомлень з обмеженням швидкості Telegram (спільний ліміт для всієї черги outbox).
+
+Глобально — токен-бакет (~30 повідомлень/с на бота), для кожного чату — не частіше ніж раз на
+PER_CHAT_INTERVAL секунд. RetryAfter (429) ставить на паузу весь бакет, мережеві помилки
+повторюються з експоненційною затримкою, Forbidden/BadRequest — остаточна помилка.
+"""
+import asyncio
+import time
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from config import BROADCAST_RATE, BROADCAST_MAX_RETRIES, PER_CHAT_INTERVAL
+
+
+def _seconds(value) -> float:
+    """RetryAfter.retry_after у різних версіях PTB — int або timedelta."""
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+class TokenBucket:
+    """Токен-бакет: rate токенів за секунду, не більше capacity накопичених."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Не видавати токени найближчі seconds секунд (відповідь 429 від Telegram)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimitedSender:
+    """send_message з глобальним і по-чатовим лімітом та повторами."""
+
+    def __init__(
+        self,
+        rate: float = BROADCAST_RATE,
+        per_chat_interval: float = PER_CHAT_INTERVAL,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+    ):
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._chat_next: dict[int, float] = {}
+
+    async def _wait_chat(self, chat_id: int):
+        now = time.monotonic()
+        ready_at = self._chat_next.get(chat_id, 0.0)
+        self._chat_next[chat_id] = max(now, ready_at) + self.per_chat_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+        if len(self._chat_next) > 10_000:
+            self._chat_next = {cid: t for cid, t in self._chat_next.items() if t > now}
+
+    async def send(self, bot, chat_id: int, text: str, max_retries: int | None = None, **kwargs):
+        """Надіслати одне повідомлення. Кидає виняток, якщо не вдалося після всіх повторів.
+        max_retries=0 — без локальних повторів мережевих помилок (повторює черга outbox)."""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            await self._wait_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except RetryAfter as e:
+                self.bucket.pause(_seconds(e.retry_after))
+            except (Forbidden, BadRequest):
+                raise
+            except NetworkError:
+                if attempt >= max_retries:
+                    raise
+                await asyncio.sleep(min(30.0, 2 ** attempt))
+            attempt += 1
+
+
+sender = RateLimitedSender()
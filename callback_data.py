@@ -0,0 +1,44 @@
+"""Компактне кодування callback_data (ліміт Telegram — 64 байти): «тег:base64url(varint-и)».
+
+encode("pt", 17, 523) → "pt:EYsE" замість "push_toggle:123456789". Лише невідʼємні цілі.
+"""
+import base64
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def encode(tag: str, *nums: int) -> str:
+    payload = b"".join(_varint(n) for n in nums)
+    return f"{tag}:{base64.urlsafe_b64encode(payload).rstrip(b'=').decode()}"
+
+
+def decode(data: str) -> tuple[str, list[int]] | None:
+    """(тег, числа) або None, якщо рядок не в цьому форматі."""
+    tag, sep, body = data.partition(":")
+    if not sep:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+    except (ValueError, TypeError):
+        return None
+    nums, n, shift = [], 0, 0
+    for byte in raw:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            nums.append(n)
+            n, shift = 0, 0
+    if shift:
+        return None
+    return tag, nums
@@ -0,0 +1,49 @@
+"""Сповіщення про зміни в розкладі після синхронізації (scheduler.job_fetch_shifts).
+
+З дельти database.sync_shifts (додані / змінені / скасовані рядки) складається одне зведене
+повідомлення на ПІБ — лише про зміни з сьогодні й далі. Одержувачі вибираються одним запитом
+за множиною змінених ПІБ, відправка — через outbox (спільний ліміт швидкості)."""
+from config import CHANGE_NOTIFY_MAX_LINES
+from database import get_change_subscribers, enqueue_messages
+from outbox import outbox
+
+
+def build_change_messages(changes: dict, today: str) -> dict[str, str]:
+    """{ПІБ: текст} для змін з датою >= today (yyyy-mm-dd)."""
+    lines_by_fio: dict[str, list[tuple[str, str]]] = {}
+
+    def add(row: dict, line: str):
+        if row.get("shift_date") and row["shift_date"] >= today:
+            lines_by_fio.setdefault(row["fio"], []).append((row["shift_date"], line))
+
+    for r in changes["inserted"]:
+        add(r, f"➕ {r['date_ddmm']} — нова зміна {r['shift_type']}, місце: {r['location']}")
+    for r in changes["updated"]:
+        add(
+            r,
+            f"✏️ {r['date_ddmm']} — зміна {r['old_shift_type']}, {r['old_location']} → "
+            f"{r['shift_type']}, {r['location']}",
+        )
+    for r in changes["deleted"]:
+        add(r, f"❌ {r['date_ddmm']} — зміну {r['shift_type']}, {r['location']} скасовано")
+
+    messages = {}
+    for fio, lines in lines_by_fio.items():
+        lines.sort()
+        shown = [line for _, line in lines[:CHANGE_NOTIFY_MAX_LINES]]
+        if len(lines) > CHANGE_NOTIFY_MAX_LINES:
+            shown.append(f"… та ще {len(lines) - CHANGE_NOTIFY_MAX_LINES}. Повний розклад — «📅 Мої зміни».")
+        messages[fio] = "🔄 Зміни у вашому розкладі:\n\n" + "\n".join(shown)
+    return messages
+
+
+async def notify_changes(changes: dict, today: str) -> int:
+    """Поставити в outbox повідомлення про зміни. Повертає кількість повідомлень."""
+    messages = build_change_messages(changes, today)
+    if not messages:
+        return 0
+    subscribers = await get_change_subscribers(list(messages))
+    queued = await enqueue_messages([(tid, messages[fio]) for tid, fio in subscribers], "change")
+    if queued:
+        outbox.wake()
+    return queued
@@ -12,9 +12,35 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 EMS_API_URL = os.getenv("EMS_API_URL", "https://ems-api.example.com")
 EMS_API_KEY = os.getenv("EMS_API_KEY", "")
 
+# Режим отримання оновлень: polling (за замовч.) або webhook (потрібен uvicorn, див. webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")  # публічна https-адреса, яку бачить Telegram
+WEBHOOK_PATH = "/" + os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _, -)
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # паралельних HTTPS-зʼєднань від Telegram
+# Скільки оновлень обробляється одночасно (в обох режимах; різні чати — паралельно, один чат — по черзі).
+# UPDATE_MAX_PENDING — скільки оновлень може чекати в роботі понад це (захист памʼяті при сплеску)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "1024"))
+# Метрики Prometheus на http://METRICS_LISTEN:METRICS_PORT/metrics; 0 — вимкнено
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+
 _db_raw = os.getenv("DATABASE_PATH", "data/bot.db")
 DB_PATH = str(PROJECT_ROOT / _db_raw) if not os.path.isabs(_db_raw) else _db_raw
 Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+# Пул зʼєднань SQLite: відкривається один раз при старті бота (main.py), спільний для всіх запитів
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_STATEMENT_CACHE = 256  # кеш підготовлених запитів на зʼєднання (sqlite3 cached_statements)
+DB_BUSY_TIMEOUT_MS = 5000
+# Кеш профілів користувачів (get_user_by_telegram_id): скільки записів і скільки секунд живе запис
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL = 300
+# Стан діалогу (очікуємо ключ, час, текст push...): памʼять + відкладений запис у SQLite
+CONVERSATION_FLUSH_INTERVAL = 1.0  # сек між записами змінених станів
+CONVERSATION_TTL = 24 * 3600  # незавершений діалог старший за добу забувається
 
 TIMEZONE = os.getenv("TIMEZONE", "Europe/Kyiv")
 
@@ -29,6 +55,37 @@ def _parse_ids(env_val: str) -> list[int]:
 
 ADMIN_IDS = _parse_ids(os.getenv("ADMIN_IDS", ""))
 
-# Розклад завантаження змін з API. Кожен запуск повністю замінює таблицю shifts (не кеш).
+# Розклад завантаження змін з API. Кожен запуск синхронізує таблицю shifts з API (застосовується лише різниця).
 # Користувач завжди бачить дані з БД на момент запиту; після наступного FETCH — актуальні з API.
 FETCH_TIMES = ["06:00", "10:00", "14:00", "18:00"]  # 4 рази на день; можна додати "12:00" тощо
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))  # сек на один запит (сторінку)
+# Вікно завантаження навколо сьогодні: FETCH_WINDOW_DAYS_AHEAD=0 — весь набір одним запитом (без вікна).
+# Вікно ріжеться на сторінки по FETCH_PAGE_DAYS днів, до FETCH_CONCURRENCY сторінок качаються паралельно.
+FETCH_WINDOW_DAYS_BACK = int(os.getenv("FETCH_WINDOW_DAYS_BACK", "7"))
+FETCH_WINDOW_DAYS_AHEAD = int(os.getenv("FETCH_WINDOW_DAYS_AHEAD", "0"))
+FETCH_PAGE_DAYS = int(os.getenv("FETCH_PAGE_DAYS", "14"))
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))
+
+# Активація: не більше KEY_ATTEMPTS_MAX спроб ввести ключ за KEY_ATTEMPTS_WINDOW сек з одного акаунта;
+# невідомі ключі відсікає фільтр Блума в памʼяті (без запиту до БД)
+KEY_ATTEMPTS_MAX = int(os.getenv("KEY_ATTEMPTS_MAX", "5"))
+KEY_ATTEMPTS_WINDOW = int(os.getenv("KEY_ATTEMPTS_WINDOW", "600"))
+KEY_FILTER_FP_RATE = 0.01  # частка невідомих ключів, що все ж доходять до БД
+KEY_FILTER_REFRESH_INTERVAL = 5.0  # не частіше ніж раз на стільки сек дочитувати нові ключі (їх додає CLI)
+
+# Після синхронізації — повідомлення користувачам (з увімкненими сповіщеннями), у кого змінився розклад
+CHANGE_NOTIFY = os.getenv("CHANGE_NOTIFY", "1") != "0"
+CHANGE_NOTIFY_MAX_LINES = 20
+
+# Відправка повідомлень (нагадування та push): ліміти Telegram — ~30 повідомлень/с на бота, ~1/с в один чат
+BROADCAST_RATE = 30
+BROADCAST_MAX_RETRIES = 3
+PER_CHAT_INTERVAL = 1.0
+
+# Черга outbox у SQLite: воркери забирають повідомлення пачками; невідправлене переживає рестарт
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_WORKERS = 10
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_POLL_INTERVAL = 1.0  # сек між перевірками порожньої черги
+OUTBOX_LEASE_SECONDS = 120  # скільки повідомлення вважається «у відправці» до повторного забору
+OUTBOX_FLUSH_EVERY = 10  # результати відправки пишуться в БД частинами: після збою повторно піде не більше стількох
@@ -0,0 +1,116 @@
+"""Стан діалогу користувача: що бот чекає наступним текстовим повідомленням.
+
+Один стан на telegram_id (+ дані кроку). Читання — з памʼяті; зміни пишуться в SQLite
+у фоні пачками (write-behind), тож рестарт не обриває активацію чи введення часу посередині.
+"""
+import asyncio
+import json
+import time
+from config import CONVERSATION_FLUSH_INTERVAL, CONVERSATION_TTL
+from database import load_conversation_states, save_conversation_states
+
+# Стани
+AWAITING_CONTACT = "awaiting_contact"  # /start без профілю: чекаємо контакт
+AWAITING_KEY = "awaiting_key"  # контакт є, чекаємо ключ активації; data: {"phone"}
+AWAITING_NOTIFY_TIME = "awaiting_notify_time"  # власний час ГГ:ХХ; data: {"user_id"}
+AWAITING_PUSH_TEXT = "awaiting_push_text"  # адмін: текст розсилки; data: {"recipients": "all" | [telegram_id]}
+AWAITING_DELETE_USER_ID = "awaiting_delete_user_id"  # адмін: telegram_id для видалення
+AWAITING_USER_SEARCH = "awaiting_user_search"  # адмін: ПІБ, телефон або telegram_id для пошуку
+
+
+class ConversationStore:
+    def __init__(self):
+        self._states: dict[int, tuple[str, dict, float]] = {}
+        self._dirty: set[int] = set()
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+
+    async def load(self):
+        """Підняти незавершені діалоги з БД (при старті бота)."""
+        rows = await load_conversation_states(CONVERSATION_TTL)
+        self._states = {
+            tid: (state, json.loads(data) if data else {}, updated_at)
+            for tid, state, data, updated_at in rows
+        }
+        self._dirty.clear()
+
+    def start(self):
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Зупинити фоновий запис і дописати все, що ще не збережено."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def get(self, telegram_id: int) -> tuple[str, dict] | None:
+        """(стан, дані) або None, якщо бот нічого не чекає від користувача."""
+        entry = self._states.get(telegram_id)
+        if entry is None:
+            return None
+        state, data, updated_at = entry
+        if time.time() - updated_at > CONVERSATION_TTL:
+            self.clear(telegram_id)
+            return None
+        return state, data
+
+    def state(self, telegram_id: int) -> str | None:
+        entry = self.get(telegram_id)
+        return entry[0] if entry else None
+
+    def set(self, telegram_id: int, state: str, **data):
+        self._states[telegram_id] = (state, data, time.time())
+        self._mark(telegram_id)
+
+    def clear(self, telegram_id: int) -> dict:
+        """Завершити діалог. Повертає дані кроку (порожній dict, якщо стану не було)."""
+        entry = self._states.pop(telegram_id, None)
+        if entry is not None:
+            self._mark(telegram_id)
+        return entry[1] if entry else {}
+
+    def _mark(self, telegram_id: int):
+        self._dirty.add(telegram_id)
+        self._wakeup.set()
+
+    async def flush(self):
+        """Записати змінені стани однією транзакцією."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for tid in dirty:
+            entry = self._states.get(tid)
+            if entry is None:
+                deletes.append(tid)
+            else:
+                state, data, updated_at = entry
+                upserts.append((tid, state, json.dumps(data) if data else None, updated_at))
+        try:
+            await save_conversation_states(upserts, deletes)
+        except Exception:
+            self._dirty |= dirty  # спробуємо ще раз наступного разу
+            raise
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[Conversation] Помилка запису стану: {e}")
+            await asyncio.sleep(CONVERSATION_FLUSH_INTERVAL)
+
+    def __len__(self):
+        return len(self._states)
+
+
+conversations = ConversationStore()
@@ -1,43 +1,124 @@
 """База данных SQLite. Дати змін зберігаються в форматі dd-mm-yyyy; для пошуку приймаємо dd-mm-yyyy або dd-mm."""
-import re
-from datetime import datetime
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
 import aiosqlite
-from config import DB_PATH
-
-
-def _normalize_ddmmyyyy(value: str, default_year: int | None = None) -> str:
-    """Привести до dd-mm-yyyy для збереження. Якщо рік відсутній — default_year (за замовч. поточний)."""
-    if not value or not isinstance(value, str):
-        return ""
-    value = value.strip()
-    year = default_year if default_year is not None else datetime.now().year
-    # Вже dd-mm-yyyy
-    m = re.match(r"^(\d{1,2})-(\d{1,2})-(\d{4})$", value)
-    if m:
-        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{m.group(3)}"
-    # dd-mm — додати рік
-    m = re.match(r"^(\d{1,2})-(\d{1,2})$", value)
-    if m:
-        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{year}"
-    # ISO 2025-02-12
-    m = re.match(r"^(\d{4})-(\d{1,2})-(\d{1,2})", value)
-    if m:
-        return f"{int(m.group(3)):02d}-{int(m.group(2)):02d}-{m.group(1)}"
-    # 12.02 або 12.02.2025
-    m = re.match(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?$", value)
-    if m:
-        y = m.group(3) if m.group(3) else str(year)
-        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{y}"
-    return value
-
-async def get_connection():
-    """Подключение к БД."""
-    return await aiosqlite.connect(DB_PATH, check_same_thread=False)
+from config import DB_PATH, DB_POOL_SIZE, DB_STATEMENT_CACHE, DB_BUSY_TIMEOUT_MS, USER_CACHE_SIZE, USER_CACHE_TTL
+from cache import TTLCache, MISSING
+from notify_schedule import schedule
+from dates import normalize_dates, ddmmyyyy_to_iso
+from metrics import instrument, DB_LATENCY
+
+
+async def _open_connection() -> aiosqlite.Connection:
+    """Відкрити зʼєднання з БД і один раз виставити PRAGMA (WAL, synchronous=NORMAL, busy_timeout)."""
+    db = await aiosqlite.connect(DB_PATH, cached_statements=DB_STATEMENT_CACHE)
+    db.row_factory = aiosqlite.Row
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA synchronous=NORMAL")
+    await db.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return db
+
+
+class ConnectionPool:
+    """Пул довгоживучих зʼєднань. Кожне зʼєднання aiosqlite — окремий потік, тому відкриваємо їх один раз на старті."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all: list[aiosqlite.Connection] = []
+
+    async def open(self):
+        for _ in range(self.size):
+            db = await _open_connection()
+            self._all.append(db)
+            self._idle.put_nowait(db)
+
+    async def close(self):
+        for db in self._all:
+            await db.close()
+        self._all.clear()
+        self._idle = asyncio.Queue()
+
+    @asynccontextmanager
+    async def acquire(self):
+        db = await self._idle.get()
+        try:
+            yield db
+        except BaseException:
+            # Не повертаємо в пул зʼєднання з незавершеною транзакцією
+            if db.in_transaction:
+                await db.rollback()
+            raise
+        finally:
+            self._idle.put_nowait(db)
+
+
+_pool: ConnectionPool | None = None
+# Профілі за telegram_id (включно з «немає такого» — None); інвалідація явна в кожному записі в users
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Знімок списку користувачів для push-вибору: (версія, ((telegram_id, fio), ...)) у порядку users.id.
+# Версія (meta.user_list_version) росте лише при додаванні/видаленні — в тій самій транзакції, — тож
+# індекси в callback_data лишаються дійсними, поки склад не змінився, і після перезапуску теж;
+# зміна ПІБ лише скидає знімок.
+_user_list: tuple[int, tuple[tuple[int, str | None], ...]] | None = None
+_user_list_gen = 0
+
+
+def _invalidate_user_list():
+    global _user_list, _user_list_gen
+    _user_list = None
+    _user_list_gen += 1
+
+
+async def _bump_user_list_version(db):
+    """Склад users змінився — нова версія списку (викликати до commit у тій самій транзакції)."""
+    await db.execute(
+        """INSERT INTO meta (key, value) VALUES ('user_list_version', '1')
+           ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"""
+    )
+
+
+async def open_db():
+    """Відкрити пул зʼєднань (викликається після init_db при старті бота)."""
+    global _pool
+    if _pool is not None:
+        return
+    pool = ConnectionPool(DB_POOL_SIZE)
+    await pool.open()
+    _pool = pool
+
+
+async def close_db():
+    """Закрити пул зʼєднань при зупинці бота."""
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.close()
+
+
+@asynccontextmanager
+async def _connect():
+    """Зʼєднання з пулу; якщо пул не відкрито (скрипти, init_db) — тимчасове зʼєднання."""
+    if _pool is not None:
+        async with _pool.acquire() as db:
+            yield db
+        return
+    db = await _open_connection()
+    try:
+        yield db
+    finally:
+        await db.close()
 
 
 async def init_db():
     """Создание таблиц."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.executescript("""
             CREATE TABLE IF NOT EXISTS activation_keys (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -70,6 +151,8 @@ async def init_db():
             );
             CREATE INDEX IF NOT EXISTS idx_shifts_fio ON shifts(fio);
             CREATE INDEX IF NOT EXISTS idx_shifts_date ON shifts(date_ddmm);
+            CREATE INDEX IF NOT EXISTS idx_shifts_date_fio ON shifts(date_ddmm, fio);
+            CREATE INDEX IF NOT EXISTS idx_notify_time ON notification_settings(enabled, hour, minute);
             CREATE TABLE IF NOT EXISTS notification_sent (
                 user_id INTEGER NOT NULL,
                 target_ddmm TEXT NOT NULL,
@@ -77,6 +160,37 @@ async def init_db():
                 PRIMARY KEY (user_id, target_ddmm),
                 FOREIGN KEY (user_id) REFERENCES users(id)
             );
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                batch_id TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                error_type TEXT,
+                last_error TEXT,
+                created_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_ready ON outbox(status, next_attempt_at);
+            CREATE INDEX IF NOT EXISTS idx_outbox_batch ON outbox(batch_id, status);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS conversation_state (
+                telegram_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL,
+                data TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS http_validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                updated_at TEXT
+            );
         """)
         await db.commit()
         try:
@@ -84,74 +198,239 @@ async def init_db():
             await db.commit()
         except Exception:
             pass
+        # Сортована дата зміни (ISO yyyy-mm-dd): ORDER BY та діапазони «з дати X» по індексу (fio, shift_date)
+        try:
+            await db.execute("ALTER TABLE shifts ADD COLUMN shift_date TEXT")
+            await db.commit()
+        except Exception:
+            pass
+        await db.execute(
+            """UPDATE shifts
+               SET shift_date = substr(date_ddmm, 7, 4) || '-' || substr(date_ddmm, 4, 2) || '-' || substr(date_ddmm, 1, 2)
+               WHERE shift_date IS NULL AND date_ddmm GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'"""
+        )
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_shifts_fio_date ON shifts(fio, shift_date)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_shifts_shift_date ON shifts(shift_date)")
+        await db.commit()
+        # Хеш рядка (дата, ПІБ, тип, місце) — sync_shifts порівнює множини хешів замість рядків
+        try:
+            await db.execute("ALTER TABLE shifts ADD COLUMN row_hash INTEGER")
+            await db.commit()
+        except Exception:
+            pass
+        cur = await db.execute("SELECT id, date_ddmm, fio, shift_type, location FROM shifts WHERE row_hash IS NULL")
+        missing = await cur.fetchall()
+        if missing:
+            # Разова міграція: порахувати хеш кожному наявному рядку
+            await db.executemany(
+                "UPDATE shifts SET row_hash = ? WHERE id = ?",
+                [(_row_hash(r[1], r[2], r[3], r[4]), r[0]) for r in missing],
+            )
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_shifts_row_hash ON shifts(row_hash)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_fio ON users(fio)")
+        await db.commit()
+        # Партія ключа (хто/коли згенерував чи імпортував) і термін дії (UTC, 'YYYY-MM-DD HH:MM:SS')
+        for column in ("batch_id TEXT", "expires_at TEXT"):
+            try:
+                await db.execute(f"ALTER TABLE activation_keys ADD COLUMN {column}")
+                await db.commit()
+            except Exception:
+                pass
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_keys_batch ON activation_keys(batch_id)")
+        # Вільні ключі по порядку id — для сторінок «🔑 Ключі» та фільтра ключів, без проходу по використаних
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_keys_unused ON activation_keys(id) WHERE used = 0")
+        await db.commit()
+        # Пошук користувачів в адмін-панелі: ПІБ без урахування регістру (fio_key = fio.casefold()) і телефон
+        try:
+            await db.execute("ALTER TABLE users ADD COLUMN fio_key TEXT")
+            await db.commit()
+        except Exception:
+            pass
+        cur = await db.execute("SELECT id, fio FROM users WHERE fio IS NOT NULL AND fio_key IS NULL")
+        missing = await cur.fetchall()
+        if missing:
+            await db.executemany("UPDATE users SET fio_key = ? WHERE id = ?", [(r[1].casefold(), r[0]) for r in missing])
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_fio_key ON users(fio_key)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone)")
+        await db.commit()
+
 
+async def redeem_key(telegram_id: int, key_text: str, phone: str | None = None) -> tuple[str, int | None]:
+    """Активація однією транзакцією: ключ позначається використаним лише якщо він ще вільний
+    (умовний UPDATE ... RETURNING під BEGIN IMMEDIATE), і в тій же транзакції створюється користувач.
 
-async def get_key_by_text(key_text: str):
-    """Найти ключ по строке. Возвращает (id, used) или None."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    Повертає ("ok", users.id) або (причина, None): "invalid" — ключа немає, "used" — вже використано,
+    "expired" — минув термін дії, "registered" — цей telegram_id уже активований (ключ не витрачається).
+    """
+    key_text = key_text.strip()
+    async with _connect() as db:
+        # Невірні та вже використані ключі відсіюються читанням, без блокування запису
         cur = await db.execute(
-            "SELECT id, used FROM activation_keys WHERE key_text = ?", (key_text.strip(),)
+            """SELECT id, used, COALESCE(expires_at <= datetime('now'), 0)
+               FROM activation_keys WHERE key_text = ?""",
+            (key_text,),
         )
         row = await cur.fetchone()
-        return dict(row) if row else None
-
-
-async def mark_key_used(key_id: int):
-    """Пометить ключ использованным."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE activation_keys SET used = 1 WHERE id = ?", (key_id,))
+        if row is None:
+            return "invalid", None
+        if row[1]:
+            return "used", None
+        if row[2]:
+            return "expired", None
+        await db.execute("BEGIN IMMEDIATE")
+        cur = await db.execute(
+            """UPDATE activation_keys SET used = 1
+               WHERE id = ? AND used = 0 AND (expires_at IS NULL OR expires_at > datetime('now'))
+               RETURNING id""",
+            (row[0],),
+        )
+        key = await cur.fetchone()
+        if key is None:  # між читанням і BEGIN ключ забрав інший користувач
+            await db.rollback()
+            return "used", None
+        cur = await db.execute(
+            """INSERT INTO users (telegram_id, key_id, phone, created_at) VALUES (?, ?, ?, datetime('now'))
+               ON CONFLICT(telegram_id) DO NOTHING RETURNING id""",
+            (telegram_id, key[0], phone or ""),
+        )
+        user = await cur.fetchone()
+        if user is None:
+            await db.rollback()
+            return "registered", None
+        await _bump_user_list_version(db)
         await db.commit()
+    user_cache.pop(telegram_id)
+    _invalidate_user_list()
+    return "ok", user[0]
 
 
 async def get_user_by_telegram_id(telegram_id: int):
-    """Пользователь по telegram_id."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """Пользователь по telegram_id. Читается через user_cache (TTL + LRU)."""
+    cached = user_cache.get(telegram_id)
+    if cached is not MISSING:
+        return dict(cached) if cached else None
+    async with _connect() as db:
         cur = await db.execute(
             "SELECT id, telegram_id, key_id, fio, phone FROM users WHERE telegram_id = ?",
             (telegram_id,),
         )
         row = await cur.fetchone()
-        return dict(row) if row else None
-
-
-async def create_user(telegram_id: int, key_id: int, phone: str | None = None):
-    """Создать пользователя после активации."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute(
-            "INSERT INTO users (telegram_id, key_id, phone) VALUES (?, ?, ?)",
-            (telegram_id, key_id, phone or ""),
-        )
-        await db.commit()
-        return cur.lastrowid
+    user = dict(row) if row else None
+    user_cache.set(telegram_id, user)
+    return dict(user) if user else None
+
+
+async def get_user_list():
+    """(версія, ((telegram_id, fio), ...)) — знімок для сторінкового вибору одержувачів push."""
+    global _user_list
+    if _user_list is not None:
+        return _user_list
+    gen = _user_list_gen
+    async with _connect() as db:
+        # Одна read-транзакція: версія і склад з одного знімка WAL
+        await db.execute("BEGIN")
+        try:
+            cur = await db.execute("SELECT value FROM meta WHERE key = 'user_list_version'")
+            version = await cur.fetchone()
+            cur = await db.execute("SELECT telegram_id, fio FROM users ORDER BY id")
+            rows = await cur.fetchall()
+        finally:
+            await db.rollback()
+    snapshot = (int(version[0]) if version else 0, tuple((r[0], r[1]) for r in rows))
+    if gen == _user_list_gen:  # поки читали, ніхто не змінив users
+        _user_list = snapshot
+    return snapshot
+
+
+async def _keyset_page(select: str, where: str, after_id: int, before_id: int | None, limit: int):
+    """Сторінка за id без OFFSET: після after_id або (якщо задано before_id) перед ним.
+    select — «SELECT ... FROM таблиця», where — додаткова умова або "". Повертає (рядки за зростанням id,
+    чи є попередня сторінка, чи є наступна)."""
+    cond = f"{where} AND " if where else ""
+    async with _connect() as db:
+        if before_id is None:
+            cur = await db.execute(f"{select} WHERE {cond}id > ? ORDER BY id LIMIT ?", (after_id, limit + 1))
+            rows = [dict(r) for r in await cur.fetchall()]
+            has_next, rows = len(rows) > limit, rows[:limit]
+            cur = await db.execute(f"SELECT EXISTS({select} WHERE {cond}id <= ?)", (after_id,))
+            has_prev = bool((await cur.fetchone())[0])
+        else:
+            cur = await db.execute(f"{select} WHERE {cond}id < ? ORDER BY id DESC LIMIT ?", (before_id, limit + 1))
+            rows = [dict(r) for r in await cur.fetchall()]
+            has_prev, rows = len(rows) > limit, rows[:limit][::-1]
+            cur = await db.execute(f"SELECT EXISTS({select} WHERE {cond}id >= ?)", (before_id,))
+            has_next = bool((await cur.fetchone())[0])
+    return rows, has_prev, has_next
+
+
+async def get_users_page(after_id: int = 0, before_id: int | None = None, limit: int = 20):
+    """Сторінка користувачів для адмін-панелі та експорту: (рядки, є попередня, є наступна)."""
+    return await _keyset_page(
+        "SELECT id, telegram_id, fio, phone, created_at FROM users", "", after_id, before_id, limit
+    )
+
+
+async def get_keys_page(after_id: int = 0, before_id: int | None = None, limit: int = 50):
+    """Сторінка доступних ключів (used=0, термін дії не минув): (рядки, є попередня, є наступна)."""
+    return await _keyset_page(
+        "SELECT id, key_text, batch_id, expires_at, created_at FROM activation_keys",
+        "used = 0 AND (expires_at IS NULL OR expires_at > datetime('now'))",
+        after_id, before_id, limit,
+    )
+
+
+async def count_users() -> int:
+    async with _connect() as db:
+        cur = await db.execute("SELECT COUNT(*) FROM users")
+        return (await cur.fetchone())[0]
+
+
+async def search_users(query: str, limit: int = 20) -> list[dict]:
+    """Пошук для адмін-панелі, кожна гілка — по індексу: число — telegram_id (точно) або початок телефону
+    (з «+» чи без, 0XX… теж як 380XX…), інакше — початок ПІБ без урахування регістру."""
+    query = query.strip()
+    columns = "SELECT id, telegram_id, fio, phone, created_at FROM users"
+    digits = query.removeprefix("+")
+    async with _connect() as db:
+        if digits.isdigit():
+            prefixes = [digits, "+" + digits]
+            if digits.startswith("0"):  # місцевий формат 0XX… — контакти Telegram зберігаються як 380XX…
+                prefixes += ["38" + digits, "+38" + digits]
+            branches = [f"{columns} WHERE telegram_id = ?"] + [f"{columns} WHERE phone >= ? AND phone < ?"] * len(prefixes)
+            params = [int(digits) if len(digits) < 19 else -1]
+            for prefix in prefixes:
+                params += [prefix, prefix + "\uffff"]
+            cur = await db.execute(" UNION ".join(branches) + " ORDER BY id LIMIT ?", (*params, limit))
+        elif query:
+            key = query.casefold()
+            cur = await db.execute(
+                f"{columns} WHERE fio_key >= ? AND fio_key < ? ORDER BY fio_key, id LIMIT ?",
+                (key, key + "\U0010ffff", limit),
+            )
+        else:
+            return []
+        return [dict(r) for r in await cur.fetchall()]
 
 
-async def get_all_users():
-    """Усі користувачі (для адмін-панелі та push «Всім»)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT id, telegram_id, fio, phone FROM users ORDER BY id"
-        )
-        rows = await cur.fetchall()
-        return [dict(r) for r in rows]
+async def count_unused_keys() -> int:
+    async with _connect() as db:
+        cur = await db.execute("SELECT COUNT(*) FROM activation_keys WHERE used = 0")
+        return (await cur.fetchone())[0]
 
 
-async def get_available_keys(limit: int = 100):
-    """Доступні ключі (used=0). Дані з БД при кожному запиті."""
-    async with aiosqlite.connect(DB_PATH) as db:
+async def get_unused_keys(after_id: int = 0, limit: int = 10_000) -> list[tuple[int, str]]:
+    """Сторінка вільних ключів (id, key_text) з id > after_id — для фільтра ключів у памʼяті."""
+    async with _connect() as db:
         cur = await db.execute(
-            "SELECT key_text FROM activation_keys WHERE used = 0 ORDER BY id LIMIT ?",
-            (limit,),
+            "SELECT id, key_text FROM activation_keys WHERE id > ? AND used = 0 ORDER BY id LIMIT ?",
+            (after_id, limit),
         )
-        rows = await cur.fetchall()
-        return [r[0] for r in rows]
+        return [(r[0], r[1]) for r in await cur.fetchall()]
 
 
 async def delete_user_by_telegram_id(telegram_id: int) -> bool:
     """Видалити користувача та всю повʼязану інфу. Повертає True якщо був видалений."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         cur = await db.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,))
         row = await cur.fetchone()
         if not row:
@@ -160,67 +439,263 @@ async def delete_user_by_telegram_id(telegram_id: int) -> bool:
         await db.execute("DELETE FROM notification_sent WHERE user_id = ?", (uid,))
         await db.execute("DELETE FROM notification_settings WHERE user_id = ?", (uid,))
         await db.execute("DELETE FROM users WHERE id = ?", (uid,))
+        await _bump_user_list_version(db)
         await db.commit()
-        return True
+    user_cache.pop(telegram_id)
+    _invalidate_user_list()
+    schedule.remove(uid)
+    return True
 
 
 async def set_user_fio(user_id: int, fio: str):
     """Привязать ФИО к пользователю."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE users SET fio = ? WHERE id = ?", (fio, user_id))
+    async with _connect() as db:
+        cur = await db.execute(
+            "UPDATE users SET fio = ?, fio_key = ? WHERE id = ? RETURNING telegram_id",
+            (fio, fio.casefold() if fio else None, user_id),
+        )
+        rows = await cur.fetchall()
         await db.commit()
+    for row in rows:
+        user_cache.pop(row[0])
+    _invalidate_user_list()
 
 
 async def reset_user_fio(user_id: int):
     """Сбросить ФИО (установить NULL)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE users SET fio = NULL WHERE id = ?", (user_id,))
+    async with _connect() as db:
+        cur = await db.execute("UPDATE users SET fio = NULL, fio_key = NULL WHERE id = ? RETURNING telegram_id", (user_id,))
+        rows = await cur.fetchall()
         await db.commit()
+    for row in rows:
+        user_cache.pop(row[0])
+    _invalidate_user_list()
 
 
-async def get_shifts_by_fio(fio: str):
-    """Все смены по ФИО, отсортированные по дате."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT date_ddmm, shift_type, location FROM shifts WHERE fio = ? ORDER BY date_ddmm",
-            (fio,),
-        )
-        rows = await cur.fetchall()
-        return [dict(r) for r in rows]
+async def load_roster():
+    """Версія ростера та всі зміни одним читанням (для roster.RosterSnapshot).
+    Повертає (version, [(date_ddmm, shift_date, fio, shift_type, location), ...])."""
+    async with _connect() as db:
+        # Одна read-транзакція: версія і рядки з одного знімка WAL
+        await db.execute("BEGIN")
+        try:
+            cur = await db.execute("SELECT value FROM meta WHERE key = 'roster_version'")
+            row = await cur.fetchone()
+            cur = await db.execute("SELECT date_ddmm, shift_date, fio, shift_type, location FROM shifts")
+            rows = [tuple(r) for r in await cur.fetchall()]
+        finally:
+            await db.rollback()
+    return (int(row[0]) if row else 0), rows
+
+
+def _row_hash(date_ddmm: str, fio: str, shift_type: str, location: str) -> int:
+    """Стабільний 64-бітний хеш рядка зміни (зберігається в shifts.row_hash)."""
+    digest = hashlib.blake2b(f"{date_ddmm}\x1f{fio}\x1f{shift_type}\x1f{location}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _stage_rows(rows) -> list[tuple[str, str, str, str, str | None]]:
+    """Рядки з API → кортежі (date_ddmm як dd-mm-yyyy, fio, shift_type, location, shift_date ISO);
+    без дати — пропускаємо. Дати нормалізуються пачкою (dates.normalize_dates), кожна різна — один раз."""
+    rows = [r for r in rows if (r.get("date_ddmm") or r.get("date"))]
+    raw = [r.get("date_ddmm") or r.get("date") for r in rows]
+    # Якщо API вже віддав dd-mm-yyyy — зберегти; інакше нормалізувати з поточним роком
+    distinct = list(dict.fromkeys(raw))
+    keys = {value: (key, ddmmyyyy_to_iso(key)) for value, key in zip(distinct, normalize_dates(distinct))}
+    return [
+        (keys[value][0], r["fio"], str(r["shift_type"]), r["location"], keys[value][1])
+        for r, value in zip(rows, raw)
+        if keys[value][0]
+    ]
+
+
+async def sync_shifts(rows) -> dict:
+    """Синхронізація змін з API диффом. Зберігається кожен рядок payload (у людини може бути кілька змін
+    на день — з різним типом чи місцем); повні дублікати рядків теж, як і раніше, не згортаються.
+    rows — список dict або асинхронний ітератор пачок (api_client.ShiftFetch): пачки нормалізуються по мірі
+    надходження. Якщо в rows є scope (множина дат dd-mm-yyyy, читається після вичитування) — видаляються
+    лише рядки з цих дат; scope None / відсутній — синхронізується вся таблиця. Валідатори HTTP зі
+    ShiftFetch (rows.validators) записуються в тій же транзакції.
+
+    Різниця рахується мультимножинами хешів рядків (shifts.row_hash → кількість): з таблиці читається лише
+    колонка хешів (зі scope — тільки дат зі scope), повні рядки — тільки для тих, що зникли; зниклий рядок
+    і новий рядок того ж (date_ddmm, fio) вважаються зміною (updated). Якщо rows.received == 0 (жодної
+    сторінки з 200), БД не чіпається зовсім; у БД пишеться лише дельта. Читання і запис — в одній
+    транзакції BEGIN IMMEDIATE, читачі до COMMIT бачать попередню версію.
+
+    Повертає {"inserted", "updated", "deleted": [dict з shift_date], "fios": set ПІБ, у кого щось змінилося,
+    "version": нова версія ростера (meta.roster_version) або None, якщо змін немає,
+    "initial": True, якщо таблиця до синхронізації була порожня}."""
+    staged: dict[int, tuple] = {}  # хеш → рядок
+    new_counts: Counter[int] = Counter()
+    if hasattr(rows, "__aiter__"):
+        async for chunk in rows:
+            for r in _stage_rows(chunk):
+                row_hash = _row_hash(*r[:4])
+                staged[row_hash] = r
+                new_counts[row_hash] += 1
+    else:
+        for r in _stage_rows(rows):
+            row_hash = _row_hash(*r[:4])
+            staged[row_hash] = r
+            new_counts[row_hash] += 1
+    scope = getattr(rows, "scope", None)
+    if getattr(rows, "received", None) == 0:
+        # Жодної сторінки з 200 (усі 304 або помилки): порівнювати нема з чим, БД не чіпаємо
+        return {"inserted": [], "updated": [], "deleted": [], "fios": set(), "version": None, "initial": False}
+
+    async with _connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            # Хеші одним рядком: у рази швидше, ніж 100k окремих рядків через потік aiosqlite.
+            # Зі scope — лише дати отриманих сторінок (і дати самих рядків), решта таблиці не читається.
+            if scope is None:
+                cur = await db.execute("SELECT group_concat(row_hash), COUNT(*) = 0 FROM shifts")
+            else:
+                cur = await db.execute(
+                    """SELECT group_concat(row_hash), NOT EXISTS (SELECT 1 FROM shifts) FROM shifts
+                       WHERE date_ddmm IN (SELECT value FROM json_each(?))""",
+                    (json.dumps(sorted(scope | {r[0] for r in staged.values()})),),
+                )
+            packed, initial = await cur.fetchone()
+            old_counts = Counter(int(h) for h in packed.split(",")) if packed else Counter()
+            # Нові або змінені: (date_ddmm, fio) → [хеш, ...] (хеш повторюється, якщо рядків-копій кілька)
+            came: dict[tuple[str, str], list[int]] = {}
+            for row_hash, count in (new_counts - old_counts).items():
+                came.setdefault(staged[row_hash][:2], []).extend([row_hash] * count)
+            gone = old_counts - new_counts  # видалені або змінені: хеш → скільки рядків зайві
+            gone_rows = []
+            if gone:
+                cur = await db.execute(
+                    """SELECT id, date_ddmm, fio, shift_type, location, shift_date, row_hash FROM shifts
+                       WHERE row_hash IN (SELECT value FROM json_each(?)) ORDER BY id DESC""",
+                    (json.dumps(list(gone)),),
+                )
+                for row in await cur.fetchall():
+                    if gone[row[6]] > 0:  # з однакових рядків зайвими вважаємо найновіші
+                        gone[row[6]] -= 1
+                        gone_rows.append(row)
+            inserted, updated, deleted = [], [], []
+            for row_id, date_ddmm, fio, shift_type, location, shift_date, _ in gone_rows:
+                hashes = came.get((date_ddmm, fio))
+                if hashes:
+                    new_hash = hashes.pop()
+                    new = staged[new_hash]
+                    updated.append({
+                        "id": row_id, "date_ddmm": date_ddmm, "fio": fio, "shift_type": new[2],
+                        "location": new[3], "old_shift_type": shift_type, "old_location": location,
+                        "shift_date": shift_date, "row_hash": new_hash,
+                    })
+                elif scope is None or date_ddmm in scope:
+                    deleted.append({
+                        "id": row_id, "date_ddmm": date_ddmm, "fio": fio, "shift_type": shift_type,
+                        "location": location, "shift_date": shift_date,
+                    })
+            for hashes in came.values():
+                for row_hash in hashes:
+                    date_ddmm, fio, shift_type, location, shift_date = staged[row_hash]
+                    inserted.append({
+                        "date_ddmm": date_ddmm, "fio": fio, "shift_type": shift_type,
+                        "location": location, "shift_date": shift_date, "row_hash": row_hash,
+                    })
+            await db.executemany("DELETE FROM shifts WHERE id = ?", [(r["id"],) for r in deleted])
+            await db.executemany(
+                "UPDATE shifts SET shift_type = ?, location = ?, row_hash = ?, fetched_at = datetime('now') WHERE id = ?",
+                [(r["shift_type"], r["location"], r["row_hash"], r["id"]) for r in updated],
+            )
+            await db.executemany(
+                """INSERT INTO shifts (date_ddmm, fio, shift_type, location, shift_date, row_hash, fetched_at)
+                   VALUES (?, ?, ?, ?, ?, ?, datetime('now'))""",
+                [
+                    (r["date_ddmm"], r["fio"], r["shift_type"], r["location"], r["shift_date"], r["row_hash"])
+                    for r in inserted
+                ],
+            )
+            version = None
+            if inserted or updated or deleted:
+                cur = await db.execute(
+                    """INSERT INTO meta (key, value) VALUES ('roster_version', '1')
+                       ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+                       RETURNING value"""
+                )
+                version = int((await cur.fetchone())[0])
+            await _store_http_validators(db, getattr(rows, "validators", None) or {})
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+    fios = {r["fio"] for r in inserted} | {r["fio"] for r in updated} | {r["fio"] for r in deleted}
+    return {
+        "inserted": inserted, "updated": updated, "deleted": deleted, "fios": fios,
+        "version": version, "initial": bool(initial),
+    }
+
+
+async def get_http_validators(url: str):
+    """Збережені ETag / Last-Modified для умовного запиту до API. Повертає dict або None."""
+    async with _connect() as db:
+        cur = await db.execute("SELECT etag, last_modified FROM http_validators WHERE url = ?", (url,))
+        row = await cur.fetchone()
+        return dict(row) if row else None
 
 
-async def get_all_fio_from_shifts():
-    """Список уникальных ФИО из смен (для выбора при активации)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT DISTINCT fio FROM shifts ORDER BY fio")
+async def _store_http_validators(db: aiosqlite.Connection, validators: dict[str, tuple[str | None, str | None]]):
+    """Запамʼятати валідатори відповідей {url: (etag, last_modified)} (або забути, якщо сервер їх не віддав).
+    Викликається всередині транзакції sync_shifts — валідатори не випереджають застосовані дані."""
+    forget = [(url,) for url, (etag, last_modified) in validators.items() if not etag and not last_modified]
+    await db.executemany("DELETE FROM http_validators WHERE url = ?", forget)
+    await db.executemany(
+        """INSERT INTO http_validators (url, etag, last_modified, updated_at)
+           VALUES (?, ?, ?, datetime('now'))
+           ON CONFLICT(url) DO UPDATE SET etag = excluded.etag,
+               last_modified = excluded.last_modified, updated_at = excluded.updated_at""",
+        [(url, etag, last_modified) for url, (etag, last_modified) in validators.items() if etag or last_modified],
+    )
+
+
+async def load_conversation_states(max_age: float) -> list[tuple[int, str, str | None, float]]:
+    """Незавершені діалоги (telegram_id, state, data JSON, updated_at) не старші max_age сек; старші видаляються."""
+    cutoff = time.time() - max_age
+    async with _connect() as db:
+        await db.execute("DELETE FROM conversation_state WHERE updated_at < ?", (cutoff,))
+        cur = await db.execute("SELECT telegram_id, state, data, updated_at FROM conversation_state")
         rows = await cur.fetchall()
-        return [r[0] for r in rows]
-
-
-async def replace_shifts(rows: list[dict]):
-    """Повна заміна даних змін. date_ddmm зберігається як dd-mm-yyyy (з API може приходити dd-mm — додається рік)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM shifts")
-        for r in rows:
-            raw = (r.get("date_ddmm") or r.get("date") or "").strip()
-            if not raw:
-                continue
-            # Якщо API вже віддав dd-mm-yyyy — зберегти; інакше нормалізувати з поточним роком
-            date_key = _normalize_ddmmyyyy(raw)
-            if not date_key:
-                continue
-            await db.execute(
-                "INSERT INTO shifts (date_ddmm, fio, shift_type, location, fetched_at) VALUES (?, ?, ?, ?, datetime('now'))",
-                (date_key, r["fio"], r["shift_type"], r["location"]),
+        await db.commit()
+        return [tuple(r) for r in rows]
+
+
+async def save_conversation_states(upserts: list[tuple[int, str, str | None, float]], deletes: list[int]):
+    """Записати пачку змін стану діалогів однією транзакцією."""
+    async with _connect() as db:
+        if upserts:
+            await db.executemany(
+                """INSERT INTO conversation_state (telegram_id, state, data, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(telegram_id) DO UPDATE SET state = excluded.state,
+                       data = excluded.data, updated_at = excluded.updated_at""",
+                upserts,
             )
+        if deletes:
+            await db.executemany("DELETE FROM conversation_state WHERE telegram_id = ?", [(t,) for t in deletes])
         await db.commit()
 
 
+async def get_change_subscribers(fios: list[str]) -> list[tuple[int, str]]:
+    """(telegram_id, fio) користувачів з увімкненими сповіщеннями, чиє ПІБ у fios. Один запит по індексу users(fio)."""
+    if not fios:
+        return []
+    async with _connect() as db:
+        cur = await db.execute(
+            """SELECT u.telegram_id, u.fio FROM users u
+               JOIN notification_settings n ON n.user_id = u.id AND n.enabled = 1
+               WHERE u.fio IN (SELECT value FROM json_each(?))""",
+            (json.dumps(fios, ensure_ascii=False),),
+        )
+        return [(r[0], r[1]) for r in await cur.fetchall()]
+
+
 async def get_notification_settings(user_id: int):
     """Настройки уведомлений пользователя."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _connect() as db:
         cur = await db.execute(
             "SELECT hour, minute, enabled FROM notification_settings WHERE user_id = ?",
             (user_id,),
@@ -231,7 +706,7 @@ async def get_notification_settings(user_id: int):
 
 async def set_notification_settings(user_id: int, hour: int, minute: int, enabled: int = 1):
     """Установить время уведомления."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect() as db:
         await db.execute(
             """INSERT INTO notification_settings (user_id, hour, minute, enabled)
                VALUES (?, ?, ?, ?)
@@ -239,65 +714,192 @@ async def set_notification_settings(user_id: int, hour: int, minute: int, enable
             (user_id, hour, minute, enabled, hour, minute, enabled),
         )
         await db.commit()
+    schedule.set(user_id, hour, minute, enabled)
 
 
-async def get_users_with_notifications_enabled():
-    """Все пользователи с включёнными уведомлениями."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def load_notification_schedule():
+    """Побудувати індекс сповіщень у памʼяті з notification_settings (при старті бота)."""
+    async with _connect() as db:
+        cur = await db.execute("SELECT user_id, hour, minute FROM notification_settings WHERE enabled = 1")
+        rows = await cur.fetchall()
+    schedule.load((r[0], r[1], r[2]) for r in rows)
+
+
+async def get_due_notifications(hour: int, minute: int, target_ddmm: str):
+    """Кому саме зараз надсилати нагадування: один запит замість циклу по всіх підписниках.
+    Повертає лише тих, у кого сповіщення на hour:minute, є зміна на target_ddmm і ще не надсилали."""
+    async with _connect() as db:
+        # MIN(s.id) — одна (перша) зміна на користувача; інші колонки SQLite бере з того ж рядка
         cur = await db.execute(
-            """SELECT u.id, u.telegram_id, u.fio, n.hour, n.minute
-               FROM users u
-               JOIN notification_settings n ON u.id = n.user_id
-               WHERE n.enabled = 1 AND u.fio IS NOT NULL"""
+            """SELECT u.id, u.telegram_id, u.fio, s.shift_type, s.location, MIN(s.id)
+               FROM notification_settings n
+               JOIN users u ON u.id = n.user_id
+               JOIN shifts s ON s.date_ddmm = ? AND s.fio = u.fio
+               WHERE n.enabled = 1 AND n.hour = ? AND n.minute = ?
+                 AND NOT EXISTS (
+                     SELECT 1 FROM notification_sent ns
+                     WHERE ns.user_id = u.id AND ns.target_ddmm = ?
+                 )
+               GROUP BY u.id""",
+            (target_ddmm, hour, minute, target_ddmm),
         )
         rows = await cur.fetchall()
-        return [dict(r) for r in rows]
+        return [
+            {"id": r[0], "telegram_id": r[1], "fio": r[2], "shift_type": r[3], "location": r[4]}
+            for r in rows
+        ]
+
+
+async def add_keys_batch(keys: list[str], batch_id: str | None = None, expires_at: str | None = None) -> list[str]:
+    """Додати ключі однією транзакцією (executemany). Повертає дублікати — ключі, що вже є в БД
+    або повторюються в самому списку; їх не додано. Великі обсяги — частинами (scripts/generate_keys.py)."""
+    now = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+    fresh, duplicates = {}, []
+    for k in keys:
+        k = k.strip()
+        if k in fresh:
+            duplicates.append(k)
+        elif k:
+            fresh[k] = None
+    async with _connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        cur = await db.execute(
+            "SELECT key_text FROM activation_keys WHERE key_text IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(fresh)),),
+        )
+        for (k,) in await cur.fetchall():
+            del fresh[k]
+            duplicates.append(k)
+        await db.executemany(
+            "INSERT INTO activation_keys (key_text, used, created_at, batch_id, expires_at) VALUES (?, 0, ?, ?, ?)",
+            [(k, now, batch_id, expires_at) for k in fresh],
+        )
+        await db.commit()
+    return duplicates
 
 
-async def was_notification_sent(user_id: int, target_ddmm: str) -> bool:
-    """Чи вже надсилали нагадування цьому користувачу на цю дату."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute(
-            "SELECT 1 FROM notification_sent WHERE user_id = ? AND target_ddmm = ?",
-            (user_id, target_ddmm),
+# --- Черга вихідних повідомлень (outbox): status pending → sending → done | failed ---
+
+async def enqueue_messages(messages: list[tuple[int, str]], kind: str, batch_id: str | None = None) -> int:
+    """Додати повідомлення (chat_id, text) у чергу на відправку. Повертає кількість доданих."""
+    if not messages:
+        return 0
+    async with _connect() as db:
+        await db.executemany(
+            "INSERT INTO outbox (chat_id, text, kind, batch_id, created_at) VALUES (?, ?, ?, ?, datetime('now'))",
+            [(chat_id, text, kind, batch_id) for chat_id, text in messages],
         )
-        return (await cur.fetchone()) is not None
+        await db.commit()
+    return len(messages)
 
 
-async def mark_notification_sent(user_id: int, target_ddmm: str):
-    """Позначити, що нагадування на дату надіслано."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
+async def enqueue_reminders(reminders: list[tuple[int, int, str]], target_ddmm: str) -> int:
+    """Нагадування (user_id, chat_id, text) у чергу та позначка notification_sent — в одній транзакції."""
+    if not reminders:
+        return 0
+    async with _connect() as db:
+        await db.executemany(
+            "INSERT INTO outbox (chat_id, text, kind, created_at) VALUES (?, ?, 'reminder', datetime('now'))",
+            [(chat_id, text) for _, chat_id, text in reminders],
+        )
+        await db.executemany(
             "INSERT OR REPLACE INTO notification_sent (user_id, target_ddmm, sent_at) VALUES (?, ?, datetime('now'))",
-            (user_id, target_ddmm),
+            [(user_id, target_ddmm) for user_id, _, _ in reminders],
         )
         await db.commit()
+    return len(reminders)
 
 
-async def get_shifts_for_date(date_str: str):
-    """Зміни на конкретну дату (для нагадувань). Приймає dd-mm-yyyy або dd-mm (парсимо до dd-mm-yyyy)."""
-    key = _normalize_ddmmyyyy(date_str)
-    if not key:
-        return []
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def claim_outbox_batch(limit: int, lease_seconds: float) -> list[dict]:
+    """Забрати до limit готових повідомлень на відправку (status → sending на lease_seconds)."""
+    now = time.time()
+    async with _connect() as db:
         cur = await db.execute(
-            "SELECT fio, shift_type, location FROM shifts WHERE date_ddmm = ?",
-            (key,),
+            """UPDATE outbox SET status = 'sending', next_attempt_at = ?
+               WHERE id IN (
+                   SELECT id FROM outbox
+                   WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                   ORDER BY id LIMIT ?
+               )
+               RETURNING id, chat_id, text, kind, batch_id, attempts, created_at""",
+            (now + lease_seconds, now, limit),
         )
         rows = await cur.fetchall()
-        return [dict(r) for r in rows]
-
-
-async def add_keys_batch(keys: list[str]):
-    """Добавить ключи в БД."""
-    import datetime
-    now = datetime.datetime.utcnow().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        for k in keys:
-            await db.execute(
-                "INSERT OR IGNORE INTO activation_keys (key_text, used, created_at) VALUES (?, 0, ?)",
-                (k.strip(), now),
-            )
         await db.commit()
+    return sorted((dict(r) for r in rows), key=lambda r: r["id"])
+
+
+async def complete_outbox(ids: list[int]):
+    """Позначити повідомлення надісланими."""
+    if not ids:
+        return
+    async with _connect() as db:
+        await db.executemany("UPDATE outbox SET status = 'done' WHERE id = ?", [(i,) for i in ids])
+        await db.commit()
+
+
+async def reschedule_outbox(retries: list[tuple[int, float, str, str]]):
+    """Повторити пізніше: (id, затримка в секундах, тип помилки, текст помилки)."""
+    if not retries:
+        return
+    now = time.time()
+    async with _connect() as db:
+        await db.executemany(
+            """UPDATE outbox SET status = 'pending', attempts = attempts + 1,
+                   next_attempt_at = ?, error_type = ?, last_error = ?
+               WHERE id = ?""",
+            [(now + delay, etype, err, i) for i, delay, etype, err in retries],
+        )
+        await db.commit()
+
+
+async def fail_outbox(failures: list[tuple[int, str, str]]):
+    """Остаточна помилка: (id, тип помилки, текст помилки)."""
+    if not failures:
+        return
+    async with _connect() as db:
+        await db.executemany(
+            """UPDATE outbox SET status = 'failed', attempts = attempts + 1, error_type = ?, last_error = ?
+               WHERE id = ?""",
+            [(etype, err, i) for i, etype, err in failures],
+        )
+        await db.commit()
+
+
+async def requeue_stale_outbox() -> int:
+    """Після рестарту: повідомлення, що «зависли» в sending, повернути в pending."""
+    async with _connect() as db:
+        cur = await db.execute("UPDATE outbox SET status = 'pending', next_attempt_at = 0 WHERE status = 'sending'")
+        await db.commit()
+        return cur.rowcount
+
+
+async def get_outbox_batch_stats(batch_id: str) -> dict:
+    """Стан розсилки: {"pending", "sending", "done", "failed", "errors": {тип: кількість}}."""
+    async with _connect() as db:
+        cur = await db.execute(
+            "SELECT status, error_type, COUNT(*) FROM outbox WHERE batch_id = ? GROUP BY status, error_type",
+            (batch_id,),
+        )
+        rows = await cur.fetchall()
+    stats = {"pending": 0, "sending": 0, "done": 0, "failed": 0, "errors": {}}
+    for status, error_type, n in rows:
+        stats[status] = stats.get(status, 0) + n
+        if status == "failed":
+            stats["errors"][error_type or "Error"] = stats["errors"].get(error_type or "Error", 0) + n
+    return stats
+
+
+async def purge_outbox(days: int = 2) -> int:
+    """Видалити з черги надіслані/остаточно невдалі повідомлення, старші за days днів."""
+    async with _connect() as db:
+        cur = await db.execute(
+            "DELETE FROM outbox WHERE status IN ('done', 'failed') AND created_at < datetime('now', ?)",
+            (f"-{int(days)} days",),
+        )
+        await db.commit()
+        return cur.rowcount
+
+
+# Метрики: час кожного публічного хелпера (без METRICS_PORT нічого не обгортається)
+instrument(globals(), DB_LATENCY)
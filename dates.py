@@ -0,0 +1,81 @@
+"""Нормалізація дат змін до dd-mm-yyyy (спільна для api_client і database).
+
+Шаблони скомпільовані один раз; вже нормалізоване значення проходить без regex;
+результати кешуються (LRU), бо в ростері повторюються ті самі кілька сотень дат.
+"""
+import re
+from datetime import date
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 4096
+
+_DMY = re.compile(r"^(\d{1,2})-(\d{1,2})-(\d{4})$")  # 12-02-2025, 1-2-2025
+_DM = re.compile(r"^(\d{1,2})-(\d{1,2})$")  # 12-02 — додати рік
+_ISO = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})")  # 2025-02-12 (можна з часом)
+_DOTTED = re.compile(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?$")  # 12.02.2025 або 12.02
+_SLASHED = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})")  # 12/02/2025
+
+
+def _is_ddmmyyyy(value: str) -> bool:
+    return (
+        len(value) == 10
+        and value[2] == "-"
+        and value[5] == "-"
+        and value[:2].isdigit()
+        and value[3:5].isdigit()
+        and value[6:].isdigit()
+    )
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize(value: str, year: int) -> str:
+    value = value.strip()
+    if _is_ddmmyyyy(value):
+        return value
+    m = _DMY.match(value)
+    if m:
+        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{m.group(3)}"
+    m = _DM.match(value)
+    if m:
+        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{year}"
+    m = _ISO.match(value)
+    if m:
+        return f"{int(m.group(3)):02d}-{int(m.group(2)):02d}-{m.group(1)}"
+    m = _DOTTED.match(value)
+    if m:
+        y = m.group(3) if m.group(3) else str(year)
+        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{y}"
+    m = _SLASHED.match(value)
+    if m:
+        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{m.group(3)}"
+    return value
+
+
+def normalize_date_to_ddmmyyyy(value: str, default_year: int | None = None) -> str:
+    """Привести дату з API до dd-mm-yyyy. Якщо рік не заданий — default_year (за замовчуванням поточний)."""
+    if not value or not isinstance(value, str):
+        return ""
+    if _is_ddmmyyyy(value):
+        return value
+    return _normalize(value, default_year if default_year is not None else date.today().year)
+
+
+def normalize_dates(values, default_year: int | None = None) -> list[str]:
+    """Нормалізувати цілу колонку дат: поточний рік обчислюється один раз на пачку."""
+    year = default_year if default_year is not None else date.today().year
+    out = []
+    for value in values:
+        if not value or not isinstance(value, str):
+            out.append("")
+        elif _is_ddmmyyyy(value):
+            out.append(value)
+        else:
+            out.append(_normalize(value, year))
+    return out
+
+
+def ddmmyyyy_to_iso(value: str) -> str | None:
+    """dd-mm-yyyy → yyyy-mm-dd (сортована дата); інший формат — None."""
+    if _is_ddmmyyyy(value):
+        return f"{value[6:]}-{value[3:5]}-{value[:2]}"
+    return None
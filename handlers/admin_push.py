@@ -1,126 +1,236 @@
-"""Адмін: панель (хто в боті, видалення), окрема вкладка Ключі, push-повідомлення."""
+"""Адмін: панель (хто в боті, пошук, видалення), окрема вкладка Ключі, вивантаження CSV, push-повідомлення."""
+import asyncio
+import codecs
+import csv
+import io
+import tempfile
+import time
+import uuid
+from datetime import date
 from telegram import Update
-from telegram.ext import ContextTypes, MessageHandler, filters
-from database import get_user_by_telegram_id, get_all_users, delete_user_by_telegram_id, get_available_keys
+from telegram.ext import ContextTypes
+from database import (
+    get_user_by_telegram_id,
+    get_users_page,
+    get_keys_page,
+    count_users,
+    search_users,
+    get_user_list,
+    delete_user_by_telegram_id,
+    enqueue_messages,
+    get_outbox_batch_stats,
+)
 from config import ADMIN_IDS
-from keyboards import push_recipients_keyboard, panel_admin_keyboard
+from keyboards import (
+    push_recipients_keyboard,
+    panel_admin_keyboard,
+    keys_admin_keyboard,
+    PANEL_PAGE_SIZE,
+    KEYS_PAGE_SIZE,
+)
+from outbox import outbox
+from conversation import conversations
+
+PUSH_PROGRESS_INTERVAL = 5  # сек між оновленнями прогресу розсилки
+SEARCH_LIMIT = 20
+EXPORT_PAGE_SIZE = 1000  # рядків на запит при вивантаженні CSV
+EXPORTS = {
+    "users": (get_users_page, ("id", "telegram_id", "fio", "phone", "created_at")),
+    "keys": (get_keys_page, ("id", "key_text", "batch_id", "expires_at", "created_at")),
+}
+
 
+async def _track_push(bot, status, batch_id: str, total: int):
+    """Прогрес розсилки з черги outbox: редагуємо повідомлення status, наприкінці — підсумок."""
+    started = time.monotonic()
+    while True:
+        await asyncio.sleep(PUSH_PROGRESS_INTERVAL)
+        try:
+            stats = await get_outbox_batch_stats(batch_id)
+        except Exception as e:  # напр. «database is locked» — спробуємо на наступному кроці
+            print(f"[Push] Не вдалося прочитати прогрес розсилки {batch_id}: {e}")
+            continue
+        done = stats["done"] + stats["failed"]
+        if stats["pending"] + stats["sending"] == 0:
+            break
+        try:
+            await status.edit_text(f"Розсилка: {done} з {total} (помилок: {stats['failed']})…")
+        except Exception:
+            pass
+    text = f"Надіслано {stats['done']} з {total} за {time.monotonic() - started:.0f} с."
+    if stats["failed"]:
+        kinds = ", ".join(f"{name}: {n}" for name, n in stats["errors"].items())
+        text += f" Помилок: {stats['failed']} ({kinds})."
+    try:
+        await status.edit_text(text)
+    except Exception:
+        await bot.send_message(chat_id=status.chat_id, text=text)
 
-async def handle_admin_push(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or not update.effective_user:
+
+async def handle_push_text(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict):
+    """Стан AWAITING_PUSH_TEXT: текст розсилки після вибору одержувачів. data: {"recipients"}."""
+    user_id = update.effective_user.id
+    if user_id not in ADMIN_IDS:
+        conversations.clear(user_id)
         return
-    # Якщо користувач у флоу активації (ключ/контакт) — передаємо в обробник ключа
-    if context.user_data.get("awaiting_key") or context.user_data.get("awaiting_contact"):
-        from .start import key_input
-        await key_input(update, context)
+    text = (update.message.text or "").strip()
+    if not text:
+        await update.message.reply_text("Введіть непустий текст.")
         return
-    # Якщо очікується введення кастомного часу сповіщення (ГГ:ХХ) — передаємо в обробник часу
-    if context.user_data.get("awaiting_notify_time"):
-        from .notify_time import handle_custom_notify_time
-        await handle_custom_notify_time(update, context)
+    recipients = conversations.clear(user_id).get("recipients")
+    if recipients == "all":
+        _, users = await get_user_list()
+        chat_ids = [tid for tid, _ in users]
+    elif isinstance(recipients, list):
+        chat_ids = recipients
+    else:
+        await update.message.reply_text("Оберіть одержувачів знову (Push → Всім або користувач).")
         return
+    # Через чергу outbox: розсилка переживає рестарт, обробка інших оновлень не чекає її кінця
+    batch_id = uuid.uuid4().hex
+    await enqueue_messages([(cid, text) for cid in chat_ids], "push", batch_id=batch_id)
+    outbox.wake()
+    status = await update.message.reply_text(f"Розсилка запущена: 0 з {len(chat_ids)}.")
+    context.application.create_task(_track_push(context.bot, status, batch_id, len(chat_ids)))
+
+
+async def handle_delete_user_id(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict):
+    """Стан AWAITING_DELETE_USER_ID: telegram_id користувача для видалення."""
     user_id = update.effective_user.id
+    conversations.clear(user_id)
     if user_id not in ADMIN_IDS:
         return
-    db_user = await get_user_by_telegram_id(user_id)
-    if not db_user:
+    raw = (update.message.text or "").strip()
+    if not raw.isdigit():
+        await update.message.reply_text("Введіть число (telegram_id зі списку вище).")
+        return
+    tid = int(raw)
+    if tid == user_id:
+        await update.message.reply_text("Не можна видалити самого себе.")
         return
+    deleted = await delete_user_by_telegram_id(tid)
+    if deleted:
+        await update.message.reply_text(
+            f"Користувача {tid} видалено. Він зможе зайти знову лише пройшовши всі кроки (контакт, ключ, ПІБ)."
+        )
+    else:
+        await update.message.reply_text(f"Користувача з id {tid} не знайдено в базі.")
+
+
+async def _is_active_admin(update: Update) -> bool:
+    """Адмін-кнопки працюють лише для активованого адміна (роутер уже перевірив ADMIN_IDS)."""
+    return await get_user_by_telegram_id(update.effective_user.id) is not None
+
+
+def _user_line(u: dict) -> str:
+    fio = (u.get("fio") or "—").strip()
+    phone = (u.get("phone") or "").strip()
+    line = f"• {u['telegram_id']} — {fio}"
+    return line + f" ({phone})" if phone else line
+
+
+async def users_page_view(after_id: int = 0, before_id: int | None = None):
+    """(текст, клавіатура) сторінки панелі; якщо сторінка зникла після видалень — перша сторінка."""
+    rows, has_prev, has_next = await get_users_page(after_id, before_id, PANEL_PAGE_SIZE)
+    if not rows and (after_id or before_id is not None):
+        rows, has_prev, has_next = await get_users_page(limit=PANEL_PAGE_SIZE)
+    if not rows:
+        return "Поки ніхто не активував бота.", panel_admin_keyboard()
+    lines = [f"📋 Хто в боті (всього {await count_users()}):\n"] + [_user_line(u) for u in rows]
+    return "\n".join(lines), panel_admin_keyboard(rows, has_prev, has_next)
 
-    # Вже очікуємо текст повідомлення (після вибору Всім/конкретного)
-    if context.user_data.get("awaiting_push_text"):
-        text = (update.message.text or "").strip()
-        if not text:
-            await update.message.reply_text("Введіть непустий текст.")
-            return
-        recipients = context.user_data.pop("push_recipients", None)
-        context.user_data.pop("awaiting_push_text", None)
-        if recipients == "all":
-            users = await get_all_users()
-            chat_ids = [u["telegram_id"] for u in users]
-        elif isinstance(recipients, list):
-            chat_ids = recipients
-        else:
-            await update.message.reply_text("Оберіть одержувачів знову (Push → Всім або користувач).")
-            return
-        sent = 0
-        failed = 0
-        for cid in chat_ids:
-            try:
-                await context.bot.send_message(chat_id=cid, text=text)
-                sent += 1
-            except Exception:
-                failed += 1
-        await update.message.reply_text(f"Надіслано {sent} одержувачам." + (f" Помилок: {failed}." if failed else ""))
+
+async def keys_page_view(after_id: int = 0, before_id: int | None = None):
+    """(текст, клавіатура) сторінки доступних ключів."""
+    rows, has_prev, has_next = await get_keys_page(after_id, before_id, KEYS_PAGE_SIZE)
+    if not rows and (after_id or before_id is not None):
+        rows, has_prev, has_next = await get_keys_page(limit=KEYS_PAGE_SIZE)
+    if not rows:
+        return "🔑 Доступних ключів немає (всі використані).", None
+    lines = ["🔑 Доступні ключі:\n"]
+    for k in rows:
+        line = f"• {k['key_text']}"
+        if k["expires_at"]:
+            line += f" (до {k['expires_at'][:10]})"
+        lines.append(line)
+    return "\n".join(lines), keys_admin_keyboard(rows, has_prev, has_next)
+
+
+async def cmd_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка «🔑 Ключі» — окрема вкладка, сторінками по KEYS_PAGE_SIZE, дані з БД при кожному запиті."""
+    if not await _is_active_admin(update):
         return
+    text, markup = await keys_page_view()
+    await update.message.reply_text(text, reply_markup=markup)
 
-    # Введення telegram_id для видалення користувача
-    if context.user_data.get("awaiting_delete_user_id"):
-        raw = (update.message.text or "").strip()
-        context.user_data.pop("awaiting_delete_user_id", None)
-        if not raw.isdigit():
-            await update.message.reply_text("Введіть число (telegram_id зі списку вище).")
-            return
-        tid = int(raw)
-        if tid == user_id:
-            await update.message.reply_text("Не можна видалити самого себе.")
-            return
-        deleted = await delete_user_by_telegram_id(tid)
-        if deleted:
-            await update.message.reply_text(
-                f"Користувача {tid} видалено. Він зможе зайти знову лише пройшовши всі кроки (контакт, ключ, ПІБ)."
-            )
-        else:
-            await update.message.reply_text(f"Користувача з id {tid} не знайдено в базі.")
+
+async def cmd_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка «📋 Панель» — хто активував бота (сторінками) + пошук, CSV, видалення."""
+    if not await _is_active_admin(update):
         return
+    text, markup = await users_page_view()
+    await update.message.reply_text(text, reply_markup=markup)
+
 
-    # Кнопка «🔑 Ключі» — окрема вкладка, дані з БД при кожному запиті
-    if update.message.text.strip() == "🔑 Ключі":
-        keys = await get_available_keys()
-        if not keys:
-            await update.message.reply_text("🔑 Доступних ключів немає (всі використані).")
-            return
-        lines = [f"🔑 Доступні ключі ({len(keys)} шт.):\n"] + [f"• {k}" for k in keys]
-        text = "\n".join(lines)
-        if len(text) > 4000:
-            text = "\n".join(lines[:1] + [f"• {k}" for k in keys[:80]]) + f"\n\n... та ще {len(keys) - 80}."
-        await update.message.reply_text(text)
+async def handle_user_search(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict):
+    """Стан AWAITING_USER_SEARCH: ПІБ (початок), телефон або telegram_id."""
+    user_id = update.effective_user.id
+    conversations.clear(user_id)
+    if user_id not in ADMIN_IDS:
         return
+    query = (update.message.text or "").strip()
+    users = await search_users(query, SEARCH_LIMIT + 1)
+    if not users:
+        await update.message.reply_text(f"За запитом «{query}» нікого не знайдено.", reply_markup=panel_admin_keyboard())
+        return
+    lines = [f"🔍 Знайдено за «{query}»:\n"] + [_user_line(u) for u in users[:SEARCH_LIMIT]]
+    if len(users) > SEARCH_LIMIT:
+        lines.append(f"\nПоказано перші {SEARCH_LIMIT} — уточніть запит.")
+    await update.message.reply_text("\n".join(lines), reply_markup=panel_admin_keyboard())
 
-    # Кнопка «📋 Панель» — список хто активував бота + кнопка видалення
-    if update.message.text.strip() == "📋 Панель":
-        users = await get_all_users()
-        if not users:
-            await update.message.reply_text(
-                "Поки ніхто не активував бота.",
-                reply_markup=panel_admin_keyboard(),
+
+async def export_csv(bot, chat_id: int, kind: str):
+    """Вивантажити користувачів або доступні ключі файлом CSV: сторінками за id у тимчасовий файл на диску,
+    тож під час побудови памʼять не залежить від розміру таблиці."""
+    fetch_page, columns = EXPORTS[kind]
+    try:
+        with tempfile.TemporaryFile() as f:
+            f.write(codecs.BOM_UTF8)  # щоб Excel відкрив кирилицю
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            after_id, total = 0, 0
+            while True:
+                rows, _, has_next = await fetch_page(after_id, None, EXPORT_PAGE_SIZE)
+                writer.writerows([row[c] for c in columns] for row in rows)
+                f.write(buf.getvalue().encode())
+                buf.seek(0)
+                buf.truncate()
+                total += len(rows)
+                if not has_next:
+                    break
+                after_id = rows[-1]["id"]
+            f.seek(0)
+            await bot.send_document(
+                chat_id=chat_id,
+                document=f,
+                filename=f"{kind}-{date.today().isoformat()}.csv",
+                caption=f"Рядків: {total}",
             )
-            return
-        lines = ["📋 Хто в боті:\n"]
-        for u in users:
-            fio = (u.get("fio") or "—").strip()
-            tid = u.get("telegram_id", "")
-            phone = (u.get("phone") or "").strip()
-            line = f"• {tid} — {fio}"
-            if phone:
-                line += f" ({phone})"
-            lines.append(line)
-        await update.message.reply_text("\n".join(lines), reply_markup=panel_admin_keyboard())
-        return
+    except Exception as e:
+        print(f"[Export] {kind}: {e}")
+        await bot.send_message(chat_id=chat_id, text="Не вдалося сформувати файл. Спробуйте пізніше.")
 
-    # Кнопка «📤 Push-сповіщення» — вибір кому надіслати
-    if update.message.text.strip() != "📤 Push-сповіщення":
+
+async def cmd_push(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка «📤 Push-сповіщення» — вибір кому надіслати."""
+    if not await _is_active_admin(update):
         return
-    users = await get_all_users()
+    version, users = await get_user_list()
     if not users:
         await update.message.reply_text("Немає користувачів для відправки.")
         return
     await update.message.reply_text(
         "Кому надіслати?",
-        reply_markup=push_recipients_keyboard(users),
+        reply_markup=push_recipients_keyboard(version, users),
     )
-
-
-admin_push_handler = MessageHandler(
-    filters.TEXT & ~filters.COMMAND,
-    handle_admin_push,
-)
@@ -1,19 +1,28 @@
-"""Обработка inline-кнопок: выбор ФИО, настройки уведомлений, push (Всім/користувач), тест нагадування."""
+"""Обработка inline-кнопок: выбор ФИО, настройки уведомлений, push (Всім/користувач), тест нагадування, гортання адмін-панелі."""
 from datetime import datetime, timedelta
 import pytz
 from telegram import Update
-from telegram.ext import ContextTypes, CallbackQueryHandler
+from telegram.ext import ContextTypes
 from config import TIMEZONE, ADMIN_IDS
 from database import (
     get_user_by_telegram_id,
     set_user_fio,
-    get_all_fio_from_shifts,
     get_notification_settings,
     set_notification_settings,
-    get_shifts_for_date,
-    get_all_users,
+    get_user_list,
 )
-from keyboards import main_menu, fio_keyboard, time_keyboard, notify_toggle_keyboard, push_recipients_keyboard, push_batch_keyboard
+from roster import get_roster, get_shifts_for_date
+from keyboards import main_menu, fio_keyboard, fio_letter_keyboard, time_keyboard, notify_toggle_keyboard, push_recipients_keyboard, push_batch_keyboard, PUSH_PAGE_SIZE
+from callback_data import decode
+from conversation import (
+    conversations,
+    AWAITING_NOTIFY_TIME,
+    AWAITING_PUSH_TEXT,
+    AWAITING_DELETE_USER_ID,
+    AWAITING_USER_SEARCH,
+)
+from .menu import render_my_shifts
+from .admin_push import users_page_view, keys_page_view, export_csv
 
 TIMEZONE_HINT = f"Часовий пояс бота: {TIMEZONE}."
 
@@ -24,6 +33,8 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     await q.answer()
     data = q.data
+    if data == "noop":
+        return
     user = update.effective_user
     if not user:
         return
@@ -32,8 +43,29 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await q.edit_message_text("Спочатку активуйте бота за ключем (/start).")
         return
 
-    if data.startswith("fio:"):
-        fio = data.replace("fio:", "", 1)
+    # Вибір ПІБ: fiog — літери, fiol:<версія>:<літера>:<сторінка> — імена, fio:<версія>:<індекс> — вибір
+    if data.startswith(("fio:", "fiol:", "fiog:")):
+        roster = await get_roster()
+        parts = data.split(":")
+        try:
+            nums = [int(x) for x in parts[1:]]
+        except ValueError:
+            return
+        if not nums or nums[0] != roster.fios_version:
+            await q.edit_message_text("Список ПІБ оновився. Оберіть ще раз:", reply_markup=fio_keyboard(roster))
+            return
+        if parts[0] == "fiog":
+            await q.edit_message_text("Оберіть ваше ПІБ:", reply_markup=fio_keyboard(roster))
+            return
+        if parts[0] == "fiol":
+            if len(nums) != 3 or not 0 <= nums[1] < len(roster.fio_letters):
+                return
+            await q.edit_message_text("Оберіть ваше ПІБ:", reply_markup=fio_letter_keyboard(roster, nums[1], nums[2]))
+            return
+        fio = roster.fio_by_id(nums[0], nums[1]) if len(nums) == 2 else None
+        if not fio:
+            await q.edit_message_text("Список ПІБ оновився. Оберіть ще раз:", reply_markup=fio_keyboard(roster))
+            return
         await set_user_fio(db_user["id"], fio)
         await q.edit_message_text(f"ПІБ збережено: {fio}. Скористайтесь меню нижче.")
         await context.bot.send_message(
@@ -43,6 +75,18 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
+    if data.startswith("my_shifts:"):
+        if not db_user.get("fio"):
+            await q.edit_message_text("Спочатку оберіть ПІБ.")
+            return
+        try:
+            page = int(data.split(":")[1])
+        except (IndexError, ValueError):
+            page = 0
+        text, markup = await render_my_shifts(db_user["fio"], page)
+        await q.edit_message_text(text, reply_markup=markup)
+        return
+
     if data.startswith("notify_hr:"):
         try:
             hour = int(data.split(":")[1])
@@ -56,8 +100,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data == "notify_custom":
-        context.user_data["awaiting_notify_time"] = True
-        context.user_data["awaiting_notify_time_user_id"] = db_user["id"]
+        conversations.set(user.id, AWAITING_NOTIFY_TIME, user_id=db_user["id"])
         await q.edit_message_text(
             f"Введіть час у форматі ГГ:ХХ або Г:ХХ (наприклад 13:30).\n\n{TIMEZONE_HINT}"
         )
@@ -106,72 +149,105 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
         return
 
-    # Адмін: вибір одержувача push (Всім, один або батч)
+    # Адмін: вибір одержувача push (Всім, один або батч). Компактні callback_data (callback_data.encode):
+    # pr/pu — сторінка/вибір одного, pb/pt — сторінка/позначка батчу; усі несуть версію знімку get_user_list().
     if data.startswith("push_to:") and user.id in ADMIN_IDS:
-        rest = data.replace("push_to:", "", 1)
-        if rest == "all":
-            context.user_data["push_recipients"] = "all"
-        else:
-            try:
-                context.user_data["push_recipients"] = [int(rest)]
-            except ValueError:
-                await q.answer("Помилка.", show_alert=True)
-                return
-        context.user_data["awaiting_push_text"] = True
+        conversations.set(user.id, AWAITING_PUSH_TEXT, recipients="all")
         await q.edit_message_text("Введіть текст повідомлення для відправки.")
         return
 
-    if data == "push_batch" and user.id in ADMIN_IDS:
-        users = await get_all_users()
+    decoded = decode(data) if user.id in ADMIN_IDS else None
+    if decoded and decoded[0] in ("pr", "pu", "pb", "pt"):
+        tag, nums = decoded
+        if len(nums) != 2:
+            return
+        version, users = await get_user_list()
         if not users:
-            await q.answer("Немає користувачів.", show_alert=True)
+            await q.edit_message_text("Немає користувачів.")
+            return
+        if nums[0] != version:
+            context.user_data.pop("push_batch", None)
+            await q.edit_message_text("Список користувачів змінився. Кому надіслати?", reply_markup=push_recipients_keyboard(version, users))
             return
-        context.user_data["push_batch_users"] = users
-        context.user_data["push_batch_selected"] = []
-        await q.edit_message_text("Оберіть одержувачів (натисніть для позначки), потім «Готово»:", reply_markup=push_batch_keyboard(users, []))
+        if tag == "pr":
+            await q.edit_message_text("Кому надіслати?", reply_markup=push_recipients_keyboard(version, users, nums[1]))
+            return
+        if tag == "pu":
+            if not 0 <= nums[1] < len(users):
+                return
+            conversations.set(user.id, AWAITING_PUSH_TEXT, recipients=[users[nums[1]][0]])
+            await q.edit_message_text("Введіть текст повідомлення для відправки.")
+            return
+        batch = context.user_data.get("push_batch")
+        if not batch or batch["version"] != version:
+            batch = context.user_data["push_batch"] = {"version": version, "bits": 0}
+        if tag == "pt":
+            if not 0 <= nums[1] < len(users):
+                return
+            batch["bits"] ^= 1 << nums[1]
+            page = nums[1] // PUSH_PAGE_SIZE
+        else:
+            page = nums[1]
+        await q.edit_message_text(
+            "Оберіть одержувачів (натисніть для позначки), потім «Готово»:",
+            reply_markup=push_batch_keyboard(version, users, batch["bits"], page),
+        )
         return
 
-    if data.startswith("push_toggle:") and user.id in ADMIN_IDS:
-        try:
-            tid = int(data.replace("push_toggle:", "", 1))
-        except ValueError:
+    # Адмін: гортання панелі та ключів за id (keyset): un/kn — після id, uv/kv — перед id
+    if decoded and decoded[0] in ("un", "uv", "kn", "kv"):
+        tag, nums = decoded
+        if len(nums) != 1:
             return
-        users = context.user_data.get("push_batch_users") or []
-        selected = list(context.user_data.get("push_batch_selected") or [])
-        if tid in selected:
-            selected = [x for x in selected if x != tid]
-        else:
-            selected = selected + [tid]
-        context.user_data["push_batch_selected"] = selected
-        await q.edit_message_text("Оберіть одержувачів (натисніть для позначки), потім «Готово»:", reply_markup=push_batch_keyboard(users, selected))
+        view = users_page_view if tag[0] == "u" else keys_page_view
+        text, markup = await (view(after_id=nums[0]) if tag[1] == "n" else view(before_id=nums[0]))
+        await q.edit_message_text(text, reply_markup=markup)
+        return
+
+    if data in ("admin_export_users", "admin_export_keys") and user.id in ADMIN_IDS:
+        kind = data.removeprefix("admin_export_")
+        context.application.create_task(export_csv(context.bot, update.effective_chat.id, kind))
+        return
+
+    if data == "admin_user_search" and user.id in ADMIN_IDS:
+        conversations.set(user.id, AWAITING_USER_SEARCH)
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Введіть початок ПІБ, телефон або telegram_id:",
+        )
         return
 
     if data == "push_batch_done" and user.id in ADMIN_IDS:
-        selected = context.user_data.pop("push_batch_selected", None) or []
-        context.user_data.pop("push_batch_users", None)
-        if not selected:
+        batch = context.user_data.pop("push_batch", None)
+        version, users = await get_user_list()
+        if not batch or batch["version"] != version:
+            await q.edit_message_text("Список користувачів змінився. Кому надіслати?", reply_markup=push_recipients_keyboard(version, users))
+            return
+        bits = batch["bits"]
+        if not bits:
+            context.user_data["push_batch"] = batch
             await q.answer("Оберіть хоча б одного одержувача.", show_alert=True)
             return
-        context.user_data["push_recipients"] = selected
-        context.user_data["awaiting_push_text"] = True
+        selected = []
+        while bits:
+            low = bits & -bits
+            selected.append(users[low.bit_length() - 1][0])
+            bits ^= low
+        conversations.set(user.id, AWAITING_PUSH_TEXT, recipients=selected)
         await q.edit_message_text("Введіть текст повідомлення для відправки.")
         return
 
     if data == "push_batch_back" and user.id in ADMIN_IDS:
-        context.user_data.pop("push_batch_selected", None)
-        context.user_data.pop("push_batch_users", None)
-        users = await get_all_users()
-        await q.edit_message_text("Кому надіслати?", reply_markup=push_recipients_keyboard(users))
+        context.user_data.pop("push_batch", None)
+        version, users = await get_user_list()
+        await q.edit_message_text("Кому надіслати?", reply_markup=push_recipients_keyboard(version, users))
         return
 
     # Адмін: режим видалення користувача
     if data == "admin_delete_user" and user.id in ADMIN_IDS:
-        context.user_data["awaiting_delete_user_id"] = True
+        conversations.set(user.id, AWAITING_DELETE_USER_ID)
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Введіть telegram_id користувача для видалення (число зі списку вище). Його дані будуть скинуті, він зможе зайти лише заново (контакт, ключ, ПІБ).",
         )
         return
-
-
-callback_handler = CallbackQueryHandler(handle_callback)
@@ -1,20 +1,26 @@
 """Главное меню: мои смены, оповещения, сброс ФИО."""
+from datetime import datetime
+import pytz
 from telegram import Update
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes
+from config import TIMEZONE
 from database import (
     get_user_by_telegram_id,
-    get_shifts_by_fio,
     reset_user_fio,
-    get_all_fio_from_shifts,
     get_notification_settings,
 )
-from keyboards import main_menu, fio_keyboard, time_keyboard, notify_toggle_keyboard
+from roster import get_roster, changed_since
+from cache import TTLCache
+from keyboards import main_menu, fio_keyboard, time_keyboard, notify_toggle_keyboard, shifts_pager_keyboard
+
+SHIFTS_PAGE_SIZE = 20
+MESSAGE_LIMIT = 4000  # ліміт Telegram 4096 символів, із запасом під заголовок сторінки
+# fio → (версія ростера, дата «сьогодні», готові сторінки «Мої зміни»)
+rendered_cache = TTLCache(maxsize=5000, ttl=24 * 3600)
 
 
 async def cmd_my_shifts(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or not update.message.text:
-        return
-    if update.message.text.strip() != "📅 Мої зміни":
+    if not update.message:
         return
     user = update.effective_user
     if not user:
@@ -24,24 +30,55 @@ async def cmd_my_shifts(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Спочатку активуйте бота (/start).")
         return
     if not db_user["fio"]:
-        fio_list = await get_all_fio_from_shifts()
-        if not fio_list:
+        roster = await get_roster()
+        if not roster.fios:
             await update.message.reply_text("Спочатку оберіть ПІБ. Дані змін поки не завантажено.")
             return
-        await update.message.reply_text("Оберіть ваше ПІБ:", reply_markup=fio_keyboard(fio_list))
-        return
-    shifts = await get_shifts_by_fio(db_user["fio"])
-    if not shifts:
-        await update.message.reply_text("За вашим ПІБ змін поки немає в базі.")
+        await update.message.reply_text("Оберіть ваше ПІБ:", reply_markup=fio_keyboard(roster))
         return
-    lines = ["📅 Ваші зміни:\n"]
-    for s in shifts:
-        lines.append(f"• {s['date_ddmm']} — зміна {s['shift_type']}, місце: {s['location']}")
-    await update.message.reply_text("\n".join(lines))
+    text, markup = await render_my_shifts(db_user["fio"], 0)
+    await update.message.reply_text(text, reply_markup=markup)
+
+
+def _split_pages(lines: list[str]) -> tuple[str, ...]:
+    """Розбити рядки на сторінки: не більше SHIFTS_PAGE_SIZE рядків і MESSAGE_LIMIT символів."""
+    pages, current, size = [], [], 0
+    for line in lines:
+        if current and (len(current) >= SHIFTS_PAGE_SIZE or size + len(line) + 1 > MESSAGE_LIMIT):
+            pages.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        pages.append("\n".join(current))
+    return tuple(pages)
+
+
+async def render_my_shifts(fio: str, page: int):
+    """Сторінка майбутніх змін (з сьогодні за TIMEZONE) для «Мої зміни»: (текст, клавіатура гортання).
+    Готові сторінки кешуються на (fio, версія ростера, сьогодні) і скидаються лише для ПІБ, чиї зміни
+    змінила остання синхронізація."""
+    roster = await get_roster()
+    today = datetime.now(pytz.timezone(TIMEZONE)).date().isoformat()
+    cached = rendered_cache.get(fio, None)
+    if cached and cached[1] == today and not changed_since(fio, cached[0]):
+        pages = cached[2]
+    else:
+        lines = [
+            f"• {date_ddmm} — зміна {shift_type}, місце: {location}"
+            for date_ddmm, shift_type, location in roster.upcoming(fio, today)
+        ]
+        pages = _split_pages(lines)
+        rendered_cache.set(fio, (roster.version, today, pages))
+    if not pages:
+        return "За вашим ПІБ майбутніх змін поки немає в базі.", None
+    page = min(max(page, 0), len(pages) - 1)
+    header = "📅 Ваші зміни:" + (f" (стор. {page + 1} з {len(pages)})" if len(pages) > 1 else "")
+    return f"{header}\n\n{pages[page]}", shifts_pager_keyboard(page, len(pages))
 
 
 async def cmd_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or update.message.text.strip() != "🔔 Сповіщення":
+    if not update.message:
         return
     user = update.effective_user
     if not user:
@@ -53,7 +90,6 @@ async def cmd_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not db_user["fio"]:
         await update.message.reply_text("Спочатку оберіть ПІБ в меню.")
         return
-    from config import TIMEZONE
     tz_hint = f"Часовий пояс бота: {TIMEZONE}."
     cur = await get_notification_settings(db_user["id"])
     if cur and cur.get("enabled") == 1:
@@ -68,7 +104,7 @@ async def cmd_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def cmd_reset_fio(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or update.message.text.strip() != "🔄 Скинути ПІБ":
+    if not update.message:
         return
     user = update.effective_user
     if not user:
@@ -81,15 +117,8 @@ async def cmd_reset_fio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ПІБ не було обрано.")
         return
     await reset_user_fio(db_user["id"])
-    fio_list = await get_all_fio_from_shifts()
-    if not fio_list:
+    roster = await get_roster()
+    if not roster.fios:
         await update.message.reply_text("ПІБ скинуто. Коли зʼявляться дані змін — оберіть ПІБ через /start.")
         return
-    await update.message.reply_text("ПІБ скинуто. Оберіть знову:", reply_markup=fio_keyboard(fio_list))
-
-
-menu_handlers = [
-    MessageHandler(filters.Regex("^📅 Мої зміни$"), cmd_my_shifts),
-    MessageHandler(filters.Regex("^🔔 Сповіщення$"), cmd_notifications),
-    MessageHandler(filters.Regex("^🔄 Скинути ПІБ$"), cmd_reset_fio),
-]
+    await update.message.reply_text("ПІБ скинуто. Оберіть знову:", reply_markup=fio_keyboard(roster))
@@ -1,10 +1,11 @@
 """Обробка введення власного часу сповіщення (ГГ:ХХ)."""
 import re
 from telegram import Update
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes
 from database import set_notification_settings
 from keyboards import notify_toggle_keyboard
 from config import TIMEZONE
+from conversation import conversations
 
 TIMEZONE_HINT = f"Часовий пояс бота: {TIMEZONE}."
 
@@ -21,15 +22,11 @@ def parse_time(text: str) -> tuple[int, int] | None:
     return None
 
 
-async def handle_custom_notify_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.user_data.get("awaiting_notify_time"):
-        return
-    if not update.message or not update.message.text:
-        return
-    user_id = context.user_data.get("awaiting_notify_time_user_id")
+async def handle_custom_notify_time(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict):
+    """Стан AWAITING_NOTIFY_TIME: власний час сповіщення. data: {"user_id"}."""
+    user_id = data.get("user_id")
     if not user_id:
-        context.user_data.pop("awaiting_notify_time", None)
-        context.user_data.pop("awaiting_notify_time_user_id", None)
+        conversations.clear(update.effective_user.id)
         return
     parsed = parse_time(update.message.text)
     if parsed is None:
@@ -39,15 +36,8 @@ async def handle_custom_notify_time(update: Update, context: ContextTypes.DEFAUL
         return
     hour, minute = parsed
     await set_notification_settings(user_id, hour, minute, 1)
-    context.user_data.pop("awaiting_notify_time", None)
-    context.user_data.pop("awaiting_notify_time_user_id", None)
+    conversations.clear(update.effective_user.id)
     await update.message.reply_text(
         f"Сповіщення увімкнено. Щодня о {hour}:{minute:02d}. {TIMEZONE_HINT}",
         reply_markup=notify_toggle_keyboard(True),
     )
-
-
-custom_notify_time_handler = MessageHandler(
-    filters.TEXT & ~filters.COMMAND,
-    handle_custom_notify_time,
-)
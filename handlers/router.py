@@ -0,0 +1,145 @@
+"""Маршрутизатор оновлень: кожне оновлення класифікується один раз і йде рівно в один обробник.
+
+Порядок: inline-кнопка → контакт → команда → кнопка меню (точний збіг підпису; адмінські — лише
+для ADMIN_IDS, перевірка множиною без звернення до БД) → стан діалогу (conversation) → ігнор.
+Для кожного маршруту рахується кількість викликів і час обробки (route_stats).
+"""
+import time
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+from config import ADMIN_IDS
+from metrics import ROUTE_LATENCY
+from conversation import (
+    conversations,
+    AWAITING_CONTACT,
+    AWAITING_KEY,
+    AWAITING_NOTIFY_TIME,
+    AWAITING_PUSH_TEXT,
+    AWAITING_DELETE_USER_ID,
+    AWAITING_USER_SEARCH,
+)
+from keyboards import BTN_MY_SHIFTS, BTN_NOTIFICATIONS, BTN_RESET_FIO, BTN_PUSH, BTN_PANEL, BTN_KEYS
+from .start import self_start, contact_received, ask_contact_first, key_input
+from .callbacks import handle_callback
+from .menu import cmd_my_shifts, cmd_notifications, cmd_reset_fio
+from .notify_time import handle_custom_notify_time
+from .admin_push import (
+    cmd_keys,
+    cmd_panel,
+    cmd_push,
+    handle_push_text,
+    handle_delete_user_id,
+    handle_user_search,
+)
+
+ADMIN_SET = frozenset(ADMIN_IDS)
+
+COMMANDS = {
+    "start": ("start", self_start),
+}
+
+MENU_ROUTES = {
+    BTN_MY_SHIFTS: ("my_shifts", cmd_my_shifts),
+    BTN_NOTIFICATIONS: ("notifications", cmd_notifications),
+    BTN_RESET_FIO: ("reset_fio", cmd_reset_fio),
+}
+
+ADMIN_ROUTES = {
+    BTN_KEYS: ("admin_keys", cmd_keys),
+    BTN_PANEL: ("admin_panel", cmd_panel),
+    BTN_PUSH: ("admin_push", cmd_push),
+}
+
+# Обробники станів отримують третім аргументом дані кроку
+STATE_HANDLERS = {
+    AWAITING_CONTACT: ask_contact_first,
+    AWAITING_KEY: key_input,
+    AWAITING_NOTIFY_TIME: handle_custom_notify_time,
+    AWAITING_PUSH_TEXT: handle_push_text,
+    AWAITING_DELETE_USER_ID: handle_delete_user_id,
+    AWAITING_USER_SEARCH: handle_user_search,
+}
+
+
+class RouteStats:
+    """Лічильники по маршрутах: кількість, сумарний і максимальний час обробки."""
+
+    def __init__(self):
+        self._stats: dict[str, list] = {}
+
+    def record(self, route: str, elapsed: float):
+        entry = self._stats.get(route)
+        if entry is None:
+            self._stats[route] = [1, elapsed, elapsed]
+            return
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed > entry[2]:
+            entry[2] = elapsed
+
+    def snapshot(self) -> dict[str, dict]:
+        """{маршрут: {"count", "avg_ms", "max_ms"}}, найчастіші першими."""
+        return {
+            route: {"count": n, "avg_ms": total / n * 1000, "max_ms": peak * 1000}
+            for route, (n, total, peak) in sorted(self._stats.items(), key=lambda kv: -kv[1][0])
+        }
+
+    def summary(self) -> str:
+        return "; ".join(
+            f"{route} ×{s['count']} avg {s['avg_ms']:.1f} мс max {s['max_ms']:.1f} мс"
+            for route, s in self.snapshot().items()
+        )
+
+
+route_stats = RouteStats()
+
+
+def classify(update: Update):
+    """(маршрут, обробник, додаткові аргументи) або None, якщо оновлення нікому не потрібне."""
+    if update.callback_query:
+        return "callback", handle_callback, ()
+    msg = update.message
+    user = update.effective_user
+    if not msg or not user:
+        return None
+    if msg.contact:
+        return "contact", contact_received, ()
+    text = msg.text
+    if not text:
+        return None
+    if text.startswith("/"):
+        command = text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+        route = COMMANDS.get(command)
+        return (*route, ()) if route else None
+    label = text.strip()
+    route = MENU_ROUTES.get(label)
+    if route is None and user.id in ADMIN_SET:
+        route = ADMIN_ROUTES.get(label)
+    if route:
+        return (*route, ())
+    entry = conversations.get(user.id)
+    if entry is None:
+        return None
+    state, data = entry
+    handler = STATE_HANDLERS.get(state)
+    if handler is None:  # стан з попередньої версії бота
+        conversations.clear(user.id)
+        return None
+    return f"state:{state}", handler, (data,)
+
+
+async def route_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    target = classify(update)
+    if target is None:
+        return
+    route, handler, args = target
+    t0 = time.perf_counter()
+    try:
+        await handler(update, context, *args)
+    finally:
+        elapsed = time.perf_counter() - t0
+        route_stats.record(route, elapsed)
+        ROUTE_LATENCY.observe(elapsed, route)
+
+
+router_handler = TypeHandler(Update, route_update)
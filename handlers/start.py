@@ -1,8 +1,20 @@
 """Старт и активация по ключу."""
+import math
 from telegram import Update, ReplyKeyboardRemove
-from telegram.ext import ContextTypes, MessageHandler, CommandHandler, filters
-from database import get_user_by_telegram_id, get_key_by_text, mark_key_used, create_user, get_all_fio_from_shifts
+from telegram.ext import ContextTypes
+from database import get_user_by_telegram_id, redeem_key
+from key_gate import key_filter, key_attempts
+from metrics import KEY_ATTEMPTS
+from roster import get_roster
 from keyboards import main_menu, fio_keyboard, request_contact_keyboard
+from conversation import conversations, AWAITING_CONTACT, AWAITING_KEY
+
+KEY_ERRORS = {
+    "invalid": "Невірний ключ.",
+    "used": "Цей ключ вже використано.",
+    "expired": "Термін дії цього ключа минув. Зверніться до адміністратора.",
+    "registered": "Бот уже активовано для вашого акаунта. Натисніть /start.",
+}
 
 
 async def self_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -17,77 +29,77 @@ async def self_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=main_menu(user.id),
             )
         else:
-            fio_list = await get_all_fio_from_shifts()
-            if not fio_list:
+            roster = await get_roster()
+            if not roster.fios:
                 await update.message.reply_text(
                     "Дані змін ще не завантажено. Зачекайте оновлення або зверніться до адміністратора."
                 )
                 return
-            kb = fio_keyboard(fio_list)
+            kb = fio_keyboard(roster)
             await update.message.reply_text(
                 "Оберіть ваше ПІБ зі списку:",
                 reply_markup=kb,
             )
         return
-    context.user_data["awaiting_contact"] = True
+    conversations.set(user.id, AWAITING_CONTACT)
     await update.message.reply_text(
         "Ласкаво просимо. Для активації спочатку обовʼязково поділіться контактом (натисніть кнопку нижче):",
         reply_markup=request_contact_keyboard(),
     )
 
 
-async def key_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Ключ приймаємо лише після контакту (awaiting_key). Без контакту — нагадуємо поділитися.
-    awaiting_key = context.user_data.get("awaiting_key")
-    awaiting_contact = context.user_data.get("awaiting_contact")
-    if not awaiting_key and not awaiting_contact:
-        return
-    if awaiting_contact and not awaiting_key:
-        await update.message.reply_text(
-            "Спочатку поділіться контактом (натисніть кнопку «Поділитися контактом»). Після цього введіть ключ активації."
-        )
-        return
+async def ask_contact_first(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict):
+    """Стан AWAITING_CONTACT: ключ приймаємо лише після контакту — нагадуємо поділитися."""
+    await update.message.reply_text(
+        "Спочатку поділіться контактом (натисніть кнопку «Поділитися контактом»). Після цього введіть ключ активації."
+    )
+
+
+async def key_input(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict):
+    """Стан AWAITING_KEY: перевірка ключа та створення профілю. data: {"phone"}."""
     key_text = (update.message.text or "").strip()
     if not key_text:
         await update.message.reply_text("Введіть ключ.")
         return
-    key_row = await get_key_by_text(key_text)
-    if not key_row:
-        await update.message.reply_text("Невірний ключ.")
+    telegram_id = update.effective_user.id
+    wait = key_attempts.hit(telegram_id)
+    if wait:
+        KEY_ATTEMPTS.inc("throttled")
+        await update.message.reply_text(f"Забагато спроб. Спробуйте ще раз через {math.ceil(wait / 60)} хв.")
         return
-    if key_row["used"] == 1:
-        await update.message.reply_text("Цей ключ вже використано.")
+    if not await key_filter.might_exist(key_text):
+        KEY_ATTEMPTS.inc("filtered")
+        await update.message.reply_text(KEY_ERRORS["invalid"])
         return
-    context.user_data.pop("awaiting_contact", None)
-    phone = context.user_data.pop("contact_phone", None) or ""
-    user_id = await create_user(update.effective_user.id, key_row["id"], phone=phone)
-    await mark_key_used(key_row["id"])
-    del context.user_data["awaiting_key"]
-    fio_list = await get_all_fio_from_shifts()
-    if not fio_list:
+    status, _ = await redeem_key(telegram_id, key_text, data.get("phone") or "")
+    KEY_ATTEMPTS.inc(status)
+    if status in ("ok", "used", "expired"):
+        key_filter.forget(key_text)
+    if status != "ok":
+        await update.message.reply_text(KEY_ERRORS[status])
+        if status == "registered":
+            conversations.clear(telegram_id)
+        return
+    key_attempts.reset(telegram_id)
+    conversations.clear(telegram_id)
+    roster = await get_roster()
+    if not roster.fios:
         await update.message.reply_text(
             "Ключ активовано. Дані змін поки не завантажено — оберіть ПІБ пізніше через /start."
         )
         return
-    kb = fio_keyboard(fio_list)
+    kb = fio_keyboard(roster)
     await update.message.reply_text("Ключ активовано. Оберіть ваше ПІБ:", reply_markup=kb)
 
 
 async def contact_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.user_data.get("awaiting_contact"):
+    if not update.effective_user or conversations.state(update.effective_user.id) != AWAITING_CONTACT:
         return
     if not update.message or not update.message.contact:
         return
     contact = update.message.contact
-    context.user_data["contact_phone"] = contact.phone_number or ""
-    context.user_data["awaiting_contact"] = False
-    context.user_data["awaiting_key"] = True
+    conversations.set(update.effective_user.id, AWAITING_KEY, phone=contact.phone_number or "")
     await update.message.reply_text(
         "Дякуємо. Тепер введіть ключ активації (одним рядком):",
         reply_markup=ReplyKeyboardRemove(),
     )
-
-
-start_handler = CommandHandler("start", self_start)
-contact_handler = MessageHandler(filters.CONTACT, contact_received)
-key_input_handler = MessageHandler(filters.TEXT & ~filters.COMMAND, key_input)
@@ -0,0 +1,177 @@
+"""Захист активації від перебору ключів.
+
+key_filter — фільтр Блума вільних ключів у памʼяті: невідомий ключ відкидається без запиту до БД
+(~KEY_FILTER_FP_RATE невідомих усе ж доходять до redeem_key, яка відповідає точно). Використані
+та прострочені ключі запамʼятовуються окремо; нові (scripts/generate_keys.py — інший процес)
+дочитуються за id при промаху, не частіше ніж раз на KEY_FILTER_REFRESH_INTERVAL.
+
+key_attempts — ковзне вікно спроб на telegram_id: не більше KEY_ATTEMPTS_MAX за KEY_ATTEMPTS_WINDOW.
+"""
+import asyncio
+import hashlib
+import math
+import time
+from collections import deque
+from config import KEY_ATTEMPTS_MAX, KEY_ATTEMPTS_WINDOW, KEY_FILTER_FP_RATE, KEY_FILTER_REFRESH_INTERVAL
+from database import count_unused_keys, get_unused_keys
+
+MIN_CAPACITY = 1024
+LOAD_PAGE = 10_000
+SWEEP_EVERY = 1024
+
+
+def _hashes(key: str) -> tuple[int, int]:
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+    """Бітовий масив на capacity елементів з заданою часткою хибнопозитивних (подвійне хешування)."""
+
+    def __init__(self, capacity: int, fp_rate: float = KEY_FILTER_FP_RATE):
+        self.capacity = max(capacity, MIN_CAPACITY)
+        self.size = math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.k = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, key: str):
+        h1, h2 = _hashes(key)
+        bits, size = self._bits, self.size
+        for i in range(self.k):
+            pos = (h1 + i * h2) % size
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = _hashes(key)
+        bits, size = self._bits, self.size
+        for i in range(self.k):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._bits.__sizeof__()
+
+
+class KeyFilter:
+    def __init__(self):
+        self._bloom: BloomFilter | None = None  # None — ще не завантажено, пропускаємо все в БД
+        self._dead: set[str] = set()  # використані / прострочені ключі, що ще сидять у фільтрі
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Побудувати фільтр у фоні (при старті бота): до готовності всі ключі йдуть у БД."""
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._load_logged())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _load_logged(self):
+        t0 = time.perf_counter()
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"[KeyFilter] Не вдалося побудувати фільтр ключів: {e}")
+            return
+        print(
+            f"Фільтр ключів: {self._bloom.count} вільних, {self._bloom.__sizeof__() // 1024} КБ, "
+            f"{(time.perf_counter() - t0) * 1000:.0f} мс"
+        )
+
+    async def load(self):
+        """Перебудувати фільтр з усіх вільних ключів (із запасом місця під нові партії)."""
+        async with self._lock:
+            await self._rebuild()
+
+    async def _rebuild(self):
+        bloom = BloomFilter(2 * await count_unused_keys())
+        last_id = 0
+        while page := await get_unused_keys(last_id, LOAD_PAGE):
+            for _, key in page:
+                bloom.add(key)
+            last_id = page[-1][0]
+            await asyncio.sleep(0)  # мільйони ключів не повинні блокувати обробку оновлень
+        self._bloom, self._dead, self._last_id = bloom, set(), last_id
+        self._refreshed_at = time.monotonic()
+
+    async def refresh(self):
+        """Дочитати ключі, додані після останнього читання (одна сторінка за id на партію)."""
+        async with self._lock:
+            if self._bloom is None or time.monotonic() - self._refreshed_at < KEY_FILTER_REFRESH_INTERVAL:
+                return
+            self._refreshed_at = time.monotonic()
+            while page := await get_unused_keys(self._last_id, LOAD_PAGE):
+                for _, key in page:
+                    self._bloom.add(key)
+                self._last_id = page[-1][0]
+            if self._bloom.count > self._bloom.capacity or len(self._dead) > self._bloom.capacity // 4:
+                await self._rebuild()
+
+    async def might_exist(self, key_text: str) -> bool:
+        """False — такого вільного ключа точно немає; True — треба перевірити в БД."""
+        if self._bloom is None:
+            return True
+        if key_text in self._bloom:
+            return key_text not in self._dead
+        await self.refresh()
+        return key_text in self._bloom and key_text not in self._dead
+
+    def forget(self, key_text: str):
+        """Ключ використано (або він прострочений) — надалі відкидати без БД."""
+        if self._bloom is not None:
+            self._dead.add(key_text)
+
+
+class AttemptLimiter:
+    """Ковзне вікно: не більше limit спроб за window сек на telegram_id."""
+
+    def __init__(self, limit: int = KEY_ATTEMPTS_MAX, window: float = KEY_ATTEMPTS_WINDOW):
+        self.limit = limit
+        self.window = window
+        self._attempts: dict[int, deque] = {}
+        self._calls = 0
+
+    def hit(self, telegram_id: int) -> float:
+        """Зарахувати спробу. 0 — можна; інакше — через скільки сек звільниться місце (спроба не зараховується)."""
+        now = time.monotonic()
+        attempts = self._attempts.get(telegram_id)
+        if attempts is None:
+            attempts = self._attempts[telegram_id] = deque()
+        while attempts and now - attempts[0] >= self.window:
+            attempts.popleft()
+        if len(attempts) >= self.limit:
+            return attempts[0] + self.window - now
+        attempts.append(now)
+        self._calls += 1
+        if self._calls % SWEEP_EVERY == 0:
+            self._sweep(now)
+        return 0.0
+
+    def reset(self, telegram_id: int):
+        self._attempts.pop(telegram_id, None)
+
+    def _sweep(self, now: float):
+        """Прибрати акаунти, чия остання спроба вже поза вікном."""
+        for telegram_id in [t for t, a in self._attempts.items() if not a or now - a[-1] >= self.window]:
+            del self._attempts[telegram_id]
+
+    def __len__(self):
+        return len(self._attempts)
+
+
+key_filter = KeyFilter()
+key_attempts = AttemptLimiter()
@@ -1,16 +1,26 @@
 """Клавиатуры бота."""
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from config import ADMIN_IDS
+from callback_data import encode
+
+# Підписи кнопок головного меню — за ними ж маршрутизує handlers/router.py (точний збіг)
+BTN_MY_SHIFTS = "📅 Мої зміни"
+BTN_NOTIFICATIONS = "🔔 Сповіщення"
+BTN_RESET_FIO = "🔄 Скинути ПІБ"
+BTN_PUSH = "📤 Push-сповіщення"
+BTN_PANEL = "📋 Панель"
+BTN_KEYS = "🔑 Ключі"
+
 
 def main_menu(telegram_id: int | None = None):
     """Головне меню після активації та вибору ПІБ. Якщо telegram_id в ADMIN_IDS — додається кнопка Push та Панель."""
     rows = [
-        [KeyboardButton("📅 Мої зміни")],
-        [KeyboardButton("🔔 Сповіщення"), KeyboardButton("🔄 Скинути ПІБ")],
+        [KeyboardButton(BTN_MY_SHIFTS)],
+        [KeyboardButton(BTN_NOTIFICATIONS), KeyboardButton(BTN_RESET_FIO)],
     ]
     if telegram_id is not None and telegram_id in ADMIN_IDS:
-        rows.append([KeyboardButton("📤 Push-сповіщення"), KeyboardButton("📋 Панель")])
-        rows.append([KeyboardButton("🔑 Ключі")])
+        rows.append([KeyboardButton(BTN_PUSH), KeyboardButton(BTN_PANEL)])
+        rows.append([KeyboardButton(BTN_KEYS)])
     return ReplyKeyboardMarkup(rows, resize_keyboard=True)
 
 
@@ -23,17 +33,65 @@ def request_contact_keyboard():
     )
 
 
-def fio_keyboard(fio_list: list[str]):
-    """Инлайн-кнопки выбора ФИО."""
-    if not fio_list:
+FIO_PAGE_SIZE = 15
+FIO_LETTERS_PER_ROW = 6
+
+
+def fio_keyboard(roster):
+    """Вибір ПІБ (roster — roster.RosterSnapshot). Невеликий список — одразу кнопки з іменами,
+    інакше спершу перші літери, далі сторінка імен. callback_data несе лише числа (версію списку та індекси),
+    тож не впирається в ліміт 64 байти для довгих кириличних ПІБ."""
+    if not roster.fios:
         return None
+    if len(roster.fios) <= FIO_PAGE_SIZE:
+        return _fio_names_keyboard(roster, 0, len(roster.fios), None, 0)
+    v = roster.fios_version
+    buttons = [
+        InlineKeyboardButton(f"{letter} ({end - start})", callback_data=f"fiol:{v}:{i}:0")
+        for i, (letter, start, end) in enumerate(roster.fio_letters)
+    ]
+    rows = [buttons[i:i + FIO_LETTERS_PER_ROW] for i in range(0, len(buttons), FIO_LETTERS_PER_ROW)]
+    return InlineKeyboardMarkup(rows)
+
+
+def fio_letter_keyboard(roster, letter_idx: int, page: int):
+    """Сторінка імен на обрану літеру з гортанням і кнопкою назад до літер."""
+    _, start, end = roster.fio_letters[letter_idx]
+    return _fio_names_keyboard(roster, start, end, letter_idx, page)
+
+
+def _fio_names_keyboard(roster, start: int, end: int, letter_idx: int | None, page: int):
+    v = roster.fios_version
+    pages = max(1, (end - start + FIO_PAGE_SIZE - 1) // FIO_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    first = start + page * FIO_PAGE_SIZE
     buttons = [
-        [InlineKeyboardButton(name, callback_data=f"fio:{name}")]
-        for name in fio_list
+        [InlineKeyboardButton(roster.fios[i], callback_data=f"fio:{v}:{i}")]
+        for i in range(first, min(end, first + FIO_PAGE_SIZE))
     ]
+    nav = []
+    if letter_idx is not None:
+        if page > 0:
+            nav.append(InlineKeyboardButton("←", callback_data=f"fiol:{v}:{letter_idx}:{page - 1}"))
+        nav.append(InlineKeyboardButton("Літери", callback_data=f"fiog:{v}"))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton("→", callback_data=f"fiol:{v}:{letter_idx}:{page + 1}"))
+        buttons.append(nav)
     return InlineKeyboardMarkup(buttons)
 
 
+def shifts_pager_keyboard(page: int, pages: int):
+    """Гортання «Мої зміни»: ← попередні / наступні →. Одна сторінка — без кнопок."""
+    if pages <= 1:
+        return None
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("← Попередні", callback_data=f"my_shifts:{page - 1}"))
+    if page < pages - 1:
+        row.append(InlineKeyboardButton("Наступні →", callback_data=f"my_shifts:{page + 1}"))
+    return InlineKeyboardMarkup([row])
+
+
 def time_keyboard():
     """Вибір часу для сповіщення (години, свій час, тест)."""
     row1 = [InlineKeyboardButton(f"{h}:00", callback_data=f"notify_hr:{h}") for h in range(6, 11)]
@@ -54,38 +112,96 @@ def notify_toggle_keyboard(enabled: bool):
     return InlineKeyboardMarkup(buttons)
 
 
-def panel_admin_keyboard():
-    """Кнопка під повідомленням панелі: видалити користувача. Ключі — окрема вкладка «🔑 Ключі»."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🗑 Видалити користувача", callback_data="admin_delete_user")],
+PANEL_PAGE_SIZE = 20
+KEYS_PAGE_SIZE = 50
+
+
+def _keyset_pager(tag: str, rows, has_prev: bool, has_next: bool):
+    """← / → для сторінок за id: кнопка несе id першого (tag+"v") або останнього (tag+"n") рядка."""
+    nav = []
+    if rows and has_prev:
+        nav.append(InlineKeyboardButton("← Попередні", callback_data=encode(tag + "v", rows[0]["id"])))
+    if rows and has_next:
+        nav.append(InlineKeyboardButton("Наступні →", callback_data=encode(tag + "n", rows[-1]["id"])))
+    return nav
+
+
+def panel_admin_keyboard(rows=(), has_prev: bool = False, has_next: bool = False):
+    """Під сторінкою панелі: гортання, пошук, вивантаження CSV, видалення. Ключі — окрема вкладка «🔑 Ключі»."""
+    buttons = []
+    nav = _keyset_pager("u", rows, has_prev, has_next)
+    if nav:
+        buttons.append(nav)
+    buttons.append([
+        InlineKeyboardButton("🔍 Знайти", callback_data="admin_user_search"),
+        InlineKeyboardButton("📄 Усі (CSV)", callback_data="admin_export_users"),
     ])
+    buttons.append([InlineKeyboardButton("🗑 Видалити користувача", callback_data="admin_delete_user")])
+    return InlineKeyboardMarkup(buttons)
+
+
+def keys_admin_keyboard(rows, has_prev: bool, has_next: bool):
+    """Під сторінкою «🔑 Ключі»: гортання і всі доступні ключі файлом."""
+    buttons = []
+    nav = _keyset_pager("k", rows, has_prev, has_next)
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton("📄 Усі доступні (CSV)", callback_data="admin_export_keys")])
+    return InlineKeyboardMarkup(buttons)
+
+
+PUSH_PAGE_SIZE = 10
+
+
+def _user_label(tid: int, fio: str | None, limit: int) -> str:
+    fio = (fio or "—").strip() or "—"
+    return f"{fio} ({tid})"[:limit]
+
+
+def _push_pager(tag: str, version: int, page: int, pages: int):
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("←", callback_data=encode(tag, version, page - 1)))
+    if pages > 1:
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("→", callback_data=encode(tag, version, page + 1)))
+    return nav
+
+
+def _push_page(users, page: int) -> tuple[int, int, int]:
+    pages = max(1, (len(users) + PUSH_PAGE_SIZE - 1) // PUSH_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    return page, pages, page * PUSH_PAGE_SIZE
 
 
-def push_recipients_keyboard(users: list[dict]):
-    """Вибір одержувачів push: Всім, один або кілька (батч). users: [{"telegram_id", "fio"}, ...]"""
+def push_recipients_keyboard(version: int, users, page: int = 0):
+    """Вибір одержувачів push: Всім, один (сторінками) або кілька (батч).
+    version, users — знімок database.get_user_list(); у кнопках лише версія та індекси."""
+    page, pages, first = _push_page(users, page)
     buttons = [[InlineKeyboardButton("Всім", callback_data="push_to:all")]]
-    for u in users:
-        fio = (u.get("fio") or "—").strip() or "—"
-        tid = u.get("telegram_id", "")
-        label = f"{fio} ({tid})"[:60]
-        buttons.append([InlineKeyboardButton(label, callback_data=f"push_to:{tid}")])
-    buttons.append([InlineKeyboardButton("📋 Обрати кількох", callback_data="push_batch")])
+    for i in range(first, min(len(users), first + PUSH_PAGE_SIZE)):
+        tid, fio = users[i]
+        buttons.append([InlineKeyboardButton(_user_label(tid, fio, 60), callback_data=encode("pu", version, i))])
+    nav = _push_pager("pr", version, page, pages)
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton("📋 Обрати кількох", callback_data=encode("pb", version, 0))])
     return InlineKeyboardMarkup(buttons)
 
 
-def push_batch_keyboard(users: list[dict], selected_ids: list[int]):
-    """Клавіатура батч-вибору: позначити кількох, потім «Готово»."""
+def push_batch_keyboard(version: int, users, selected: int, page: int = 0):
+    """Сторінка батч-вибору. selected — бітова маска індексів users; перемальовується лише поточна сторінка."""
+    page, pages, first = _push_page(users, page)
     buttons = []
-    for u in users:
-        tid = u.get("telegram_id")
-        fio = (u.get("fio") or "—").strip() or "—"
-        label = f"{fio} ({tid})"[:55]
-        if tid in selected_ids:
-            label = "✓ " + label
-        else:
-            label = "○ " + label
-        buttons.append([InlineKeyboardButton(label, callback_data=f"push_toggle:{tid}")])
-    n = len(selected_ids)
+    for i in range(first, min(len(users), first + PUSH_PAGE_SIZE)):
+        tid, fio = users[i]
+        mark = "✓ " if selected >> i & 1 else "○ "
+        buttons.append([InlineKeyboardButton(mark + _user_label(tid, fio, 55), callback_data=encode("pt", version, i))])
+    nav = _push_pager("pb", version, page, pages)
+    if nav:
+        buttons.append(nav)
+    n = selected.bit_count()
     done_label = f"Готово — надіслати вибраним ({n})" if n else "Готово — надіслати вибраним"
     buttons.append([InlineKeyboardButton(done_label, callback_data="push_batch_done")])
     buttons.append([InlineKeyboardButton("← Назад", callback_data="push_batch_back")])
@@ -1,19 +1,65 @@
 """Точка входа: запуск бота."""
 import asyncio
 from telegram.ext import Application
-from config import BOT_TOKEN
-from database import init_db
+from config import BOT_TOKEN, BOT_MODE, UPDATE_CONCURRENCY, UPDATE_MAX_PENDING
+from database import init_db, open_db, close_db, load_notification_schedule
+from notify_schedule import schedule
+from outbox import outbox
+import metrics
+from conversation import conversations
+from key_gate import key_filter
+from api_client import close_client
 from handlers import setup_handlers
+from handlers.router import route_stats
 from scheduler import setup_jobs
+from update_processor import ChatOrderedUpdateProcessor
+
+
+async def on_startup(app: Application):
+    """Відкрити спільний пул зʼєднань з БД у циклі подій бота, побудувати індекс сповіщень,
+    підняти незавершені діалоги, фільтр ключів і outbox."""
+    await open_db()
+    await load_notification_schedule()
+    await conversations.load()
+    conversations.start()
+    key_filter.start()
+    outbox.start(app.bot)
+    await metrics.start_server()
+    peaks = ", ".join(f"{hm} — {n}" for hm, n in schedule.peaks())
+    print(f"Сповіщення: {len(schedule)} підписників" + (f"; пікові хвилини: {peaks}" if peaks else ""))
+
+
+async def on_shutdown(app: Application):
+    if route_stats.snapshot():
+        print(f"Маршрути: {route_stats.summary()}")
+    await metrics.stop_server()
+    await outbox.stop()
+    await key_filter.stop()
+    await conversations.stop()
+    await close_client()
+    await close_db()
+
 
 def main():
     if not BOT_TOKEN:
         print("Вкажіть BOT_TOKEN в .env")
         return
     asyncio.run(init_db())
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING))
+        .build()
+    )
     setup_handlers(app)
     setup_jobs(app)
+    if BOT_MODE == "webhook":
+        from webhook import run_webhook
+        print("Бот запущено (webhook).")
+        asyncio.run(run_webhook(app))
+        return
     print("Бот запущено.")
     app.run_polling(drop_pending_updates=True)
 
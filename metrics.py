@@ -0,0 +1,169 @@
+"""Метрики бота у текстовому форматі Prometheus і локальний HTTP-ендпоінт GET /metrics.
+
+Вмикаються METRICS_PORT (0 — вимкнено). Вимкнені метрики майже нічого не коштують:
+observe/inc повертаються першим рядком, а timed/instrument взагалі не обгортають функції.
+"""
+import asyncio
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from config import METRICS_LISTEN, METRICS_PORT
+
+ENABLED = METRICS_PORT > 0
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000)
+
+_registry: list = []
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        if not ENABLED:
+            return
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}  # labels -> [лічильники по кошиках (+Inf останній), сума, кількість]
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        if not ENABLED:
+            return
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, n) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="%s"' % (bound if bound == "+Inf" else f"{bound:g}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+def timed(histogram: Histogram, label: str):
+    """Декоратор async-функції: тривалість кожного виклику в histogram з міткою label."""
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - t0, label)
+        return wrapper
+    return decorator
+
+
+def instrument(namespace: dict, histogram: Histogram):
+    """Обгорнути timed(...) усі публічні async-функції модуля (викликати в кінці модуля з globals())."""
+    if not ENABLED:
+        return
+    module = namespace["__name__"]
+    for name, fn in list(namespace.items()):
+        if not name.startswith("_") and inspect.iscoroutinefunction(fn) and fn.__module__ == module:
+            namespace[name] = timed(histogram, name)(fn)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Метрики бота
+ROUTE_LATENCY = Histogram("bot_route_seconds", "Час обробки оновлення за маршрутом", ("route",))
+DB_LATENCY = Histogram("bot_db_seconds", "Час виконання хелпера database.py (разом з очікуванням зʼєднання)", ("helper",))
+FETCH_DURATION = Histogram(
+    "bot_fetch_seconds", "Тривалість завантаження змін з EMS API",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+FETCH_PAGES = Counter("bot_fetch_pages_total", "Сторінки EMS API за результатом (200, 304, error)", ("status",))
+FETCH_BYTES = Counter("bot_fetch_bytes_total", "Завантажено байтів з EMS API")
+SYNC_DELTA = Histogram("bot_sync_rows", "Розмір зміни таблиці shifts за синхронізацію", ("kind",), buckets=SIZE_BUCKETS)
+REMINDER_LAG = Histogram(
+    "bot_reminder_lag_seconds", "Затримка нагадування: від запланованої хвилини до відправки",
+    buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600),
+)
+MESSAGES_SENT = Counter("bot_messages_sent_total", "Надіслані повідомлення з outbox", ("kind",))
+KEY_ATTEMPTS = Counter("bot_key_attempts_total", "Спроби ввести ключ активації за результатом", ("result",))
+SEND_ERRORS = Counter("bot_send_errors_total", "Помилки відправки в Telegram за типом", ("kind", "error"))
+
+
+_server: asyncio.AbstractServer | None = None
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        method, path, *_ = request.split(b"\r\n", 1)[0].decode("latin-1").split(" ")
+        if method == "GET" and path.split("?", 1)[0] == "/metrics":
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server():
+    """Підняти /metrics на METRICS_LISTEN:METRICS_PORT (лише якщо метрики увімкнено)."""
+    global _server
+    if not ENABLED or _server:
+        return
+    _server = await asyncio.start_server(_handle, METRICS_LISTEN, METRICS_PORT)
+    print(f"Метрики: http://{METRICS_LISTEN}:{METRICS_PORT}/metrics")
+
+
+async def stop_server():
+    global _server
+    if _server:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
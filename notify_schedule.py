@@ -0,0 +1,54 @@
+"""Індекс сповіщень у памʼяті: 1440 кошиків за хвилиною доби (локальний час), у кожному — user_id.
+Будується при старті з notification_settings, далі оновлюється інкрементально з database.py."""
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class NotificationSchedule:
+    def __init__(self):
+        self._buckets: list[set[int]] = [set() for _ in range(MINUTES_PER_DAY)]
+        self._slot_by_user: dict[int, int] = {}
+
+    def load(self, rows):
+        """Перебудувати індекс з рядків (user_id, hour, minute) увімкнених сповіщень."""
+        for bucket in self._buckets:
+            bucket.clear()
+        self._slot_by_user.clear()
+        for user_id, hour, minute in rows:
+            self.set(user_id, hour, minute, 1)
+
+    def set(self, user_id: int, hour: int, minute: int, enabled: int = 1):
+        """Перенести користувача в кошик hour:minute (або прибрати, якщо сповіщення вимкнено)."""
+        self.remove(user_id)
+        if not enabled:
+            return
+        slot = (int(hour) % 24) * 60 + int(minute) % 60
+        self._buckets[slot].add(user_id)
+        self._slot_by_user[user_id] = slot
+
+    def remove(self, user_id: int):
+        slot = self._slot_by_user.pop(user_id, None)
+        if slot is not None:
+            self._buckets[slot].discard(user_id)
+
+    def users_at(self, hour: int, minute: int) -> frozenset[int]:
+        """Користувачі, яким нагадування о hour:minute."""
+        return frozenset(self._buckets[hour * 60 + minute])
+
+    def bucket_sizes(self) -> dict[str, int]:
+        """Непорожні кошики: {"ГГ:ХХ": кількість підписників}."""
+        return {
+            f"{slot // 60:02d}:{slot % 60:02d}": len(bucket)
+            for slot, bucket in enumerate(self._buckets)
+            if bucket
+        }
+
+    def peaks(self, n: int = 5) -> list[tuple[str, int]]:
+        """n найбільш завантажених хвилин (наприклад 08:00)."""
+        return sorted(self.bucket_sizes().items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    def __len__(self):
+        return len(self._slot_by_user)
+
+
+schedule = NotificationSchedule()
@@ -0,0 +1,135 @@
+"""Воркер черги outbox: забирає повідомлення з SQLite пачками, надсилає під спільним лімітом
+швидкості (broadcast.sender) і позначає done / повтор з backoff / failed."""
+import asyncio
+import time
+from datetime import datetime, timezone
+from telegram.error import BadRequest, Forbidden
+from broadcast import sender
+from config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_WORKERS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_FLUSH_EVERY,
+)
+from database import (
+    claim_outbox_batch,
+    complete_outbox,
+    reschedule_outbox,
+    fail_outbox,
+    requeue_stale_outbox,
+)
+from metrics import ENABLED as METRICS_ENABLED, MESSAGES_SENT, REMINDER_LAG, SEND_ERRORS
+
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+
+
+def _reminder_lag(created_at: str | None) -> float | None:
+    """Секунди від хвилини, у яку нагадування поставлено в чергу (created_at, UTC), до зараз."""
+    if not created_at:
+        return None
+    scheduled = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").replace(second=0, tzinfo=timezone.utc)
+    return time.time() - scheduled.timestamp()
+
+
+class OutboxWorker:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._bot = None
+
+    def start(self, bot):
+        """Запустити обробку черги у фоні (в циклі подій бота)."""
+        if self._task:
+            return
+        self._bot = bot
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        """Щось додали в чергу — не чекати наступного опитування."""
+        self._wakeup.set()
+
+    async def _run(self):
+        requeued = await requeue_stale_outbox()
+        if requeued:
+            print(f"[Outbox] Відновлено після рестарту: {requeued} повідомлень")
+        while True:
+            try:
+                batch = await claim_outbox_batch(OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS)
+                if batch:
+                    await self._process(batch)
+                    continue
+            except Exception as e:
+                # Напр. «database is locked» під час sync_shifts: незаписані повідомлення повернуться після lease
+                print(f"[Outbox] Помилка обробки черги: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, batch: list[dict]):
+        done: list[int] = []
+        retries: list[tuple[int, float, str, str]] = []
+        failures: list[tuple[int, str, str]] = []
+        pending = iter(batch)
+
+        async def flush(force: bool = False):
+            """Записати накопичені результати, щойно їх OUTBOX_FLUSH_EVERY (або всі — в кінці пачки)."""
+            if not force and len(done) + len(retries) + len(failures) < OUTBOX_FLUSH_EVERY:
+                return
+            sent, later, failed = done[:], retries[:], failures[:]
+            done.clear()
+            retries.clear()
+            failures.clear()
+            await complete_outbox(sent)
+            await reschedule_outbox(later)
+            await fail_outbox(failed)
+
+        async def worker():
+            for msg in pending:
+                try:
+                    await sender.send(self._bot, msg["chat_id"], msg["text"], max_retries=0)
+                    done.append(msg["id"])
+                    if METRICS_ENABLED:
+                        MESSAGES_SENT.inc(msg["kind"])
+                        lag = _reminder_lag(msg.get("created_at")) if msg["kind"] == "reminder" else None
+                        if lag is not None:
+                            REMINDER_LAG.observe(lag)
+                except (Forbidden, BadRequest) as e:
+                    failures.append((msg["id"], type(e).__name__, str(e)[:200]))
+                    SEND_ERRORS.inc(msg["kind"], type(e).__name__)
+                except Exception as e:
+                    SEND_ERRORS.inc(msg["kind"], type(e).__name__)
+                    attempts = msg["attempts"] + 1
+                    if attempts >= OUTBOX_MAX_ATTEMPTS:
+                        failures.append((msg["id"], type(e).__name__, str(e)[:200]))
+                        print(f"[Outbox] {msg['kind']} для {msg['chat_id']} не надіслано: {e}")
+                    else:
+                        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+                        retries.append((msg["id"], delay, type(e).__name__, str(e)[:200]))
+                await flush()
+
+        # Збій запису в одному воркері не зупиняє решту: пачка досилається, помилка — після
+        results = await asyncio.gather(
+            *(worker() for _ in range(min(OUTBOX_WORKERS, len(batch)))), return_exceptions=True
+        )
+        await flush(force=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+
+outbox = OutboxWorker()
@@ -0,0 +1,149 @@
+"""Знімок ростера в памʼяті: зміни змінюються лише після синхронізації з API (4 рази на день),
+тож усі читання (Мої зміни, список ПІБ, зміни на дату) обслуговуються з незмінного знімка.
+
+Знімок будується один раз після кожної успішної синхронізації і підміняється атомарно (одне
+присвоєння посилання) разом з номером версії. Після рестарту — будується ліниво з БД при першому читанні.
+"""
+import asyncio
+import sys
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from dates import normalize_date_to_ddmmyyyy
+from database import load_roster
+
+_FAR_FUTURE = "9999-12-31"  # сортування змін з нерозпізнаною датою (shift_date NULL) — в кінець
+
+
+@dataclass(frozen=True)
+class RosterSnapshot:
+    version: int
+    # fio → (відсортовані shift_date, рядки (date_ddmm, shift_type, location) у тому ж порядку)
+    by_fio: dict[str, tuple[tuple[str, ...], tuple[tuple[str, str, str], ...]]]
+    # date_ddmm → рядки (fio, shift_type, location)
+    by_date: dict[str, tuple[tuple[str, str, str], ...]]
+    fios: tuple[str, ...]
+    rows: int
+    # Версія, з якої список fios не змінювався — індекси в ньому (callback_data вибору ПІБ) дійсні
+    fios_version: int = 0
+    # Префіксний індекс для вибору ПІБ: (перша літера, початок, кінець) — зрізи відсортованого fios
+    fio_letters: tuple[tuple[str, int, int], ...] = ()
+    built_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def build(cls, version: int, rows, previous: "RosterSnapshot | None" = None) -> "RosterSnapshot":
+        per_fio: dict[str, list] = {}
+        per_date: dict[str, list] = {}
+        for date_ddmm, shift_date, fio, shift_type, location in rows:
+            per_fio.setdefault(fio, []).append((shift_date or _FAR_FUTURE, (date_ddmm, shift_type, location)))
+            per_date.setdefault(date_ddmm, []).append((fio, shift_type, location))
+        by_fio = {}
+        for fio, items in per_fio.items():
+            items.sort(key=lambda item: item[0])
+            by_fio[fio] = (tuple(d for d, _ in items), tuple(r for _, r in items))
+        by_date = {d: tuple(items) for d, items in per_date.items()}
+        # Без урахування регістру: «іван …» стоїть серед «І…», кожна літера — один суцільний зріз fio_letters
+        fios = tuple(sorted(by_fio, key=lambda fio: (fio.casefold(), fio)))
+        if previous is not None and previous.fios == fios:
+            fios_version = previous.fios_version
+        else:
+            fios_version = version
+        letters = []
+        for i, fio in enumerate(fios):
+            letter = fio[:1].upper() or "?"
+            if letters and letters[-1][0] == letter:
+                letters[-1][2] = i + 1
+            else:
+                letters.append([letter, i, i + 1])
+        return cls(
+            version,
+            by_fio,
+            by_date,
+            fios,
+            len(rows),
+            fios_version=fios_version,
+            fio_letters=tuple(tuple(x) for x in letters),
+        )
+
+    def upcoming(self, fio: str, from_date: str) -> tuple[tuple[str, str, str], ...]:
+        """Зміни за ПІБ з from_date (yyyy-mm-dd) включно, за зростанням дати."""
+        entry = self.by_fio.get(fio)
+        if not entry:
+            return ()
+        dates, rows = entry
+        return rows[bisect_left(dates, from_date):]
+
+    def fio_by_id(self, fios_version: int, index: int) -> str | None:
+        """ПІБ за компактним id з callback_data; None, якщо список відтоді змінився."""
+        if fios_version != self.fios_version or not 0 <= index < len(self.fios):
+            return None
+        return self.fios[index]
+
+    def memory_bytes(self) -> int:
+        """Приблизний розмір знімка в памʼяті (контейнери + рядки, без інтернованих дублікатів)."""
+        seen = set()
+
+        def size(obj) -> int:
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            total = sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                total += sum(size(k) + size(v) for k, v in obj.items())
+            elif isinstance(obj, (tuple, list)):
+                total += sum(size(x) for x in obj)
+            return total
+
+        return size(self.by_fio) + size(self.by_date) + size(self.fios)
+
+
+_snapshot: RosterSnapshot | None = None
+_lock = asyncio.Lock()
+# Для кешів, похідних від ростера: у якій версії востаннє змінилися зміни кожного ПІБ
+_fio_changed_in: dict[str, int] = {}
+_all_changed_in = 0  # перебудова без відомої різниці (старт) — змінилося все
+
+
+async def get_roster() -> RosterSnapshot:
+    """Поточний знімок; після рестарту будується з БД при першому зверненні."""
+    snapshot = _snapshot
+    if snapshot is not None:
+        return snapshot
+    async with _lock:
+        if _snapshot is None:
+            await rebuild_roster()
+        return _snapshot
+
+
+async def rebuild_roster(changed_fios=None) -> RosterSnapshot:
+    """Перебудувати знімок з БД і атомарно підмінити поточний (викликається після синхронізації).
+    changed_fios — ПІБ, чиї зміни змінилися (з sync_shifts); None — вважати, що змінилися всі."""
+    global _snapshot, _all_changed_in
+    version, rows = await load_roster()
+    snapshot = RosterSnapshot.build(version, rows, _snapshot)
+    if changed_fios is None:
+        _all_changed_in = version
+    else:
+        for fio in changed_fios:
+            _fio_changed_in[fio] = version
+    _snapshot = snapshot
+    return snapshot
+
+
+def changed_since(fio: str, version: int) -> bool:
+    """Чи змінювалися зміни fio після версії ростера version (для інвалідації похідних кешів)."""
+    return version < max(_all_changed_in, _fio_changed_in.get(fio, 0))
+
+
+# --- Читання змін (раніше — запити до SQLite на кожен виклик) ---
+
+async def get_shifts_for_date(date_str: str):
+    """Зміни на конкретну дату (для нагадувань). Приймає dd-mm-yyyy або dd-mm (парсимо до dd-mm-yyyy)."""
+    key = normalize_date_to_ddmmyyyy(date_str)
+    if not key:
+        return []
+    roster = await get_roster()
+    return [
+        {"fio": fio, "shift_type": t, "location": loc}
+        for fio, t, loc in roster.by_date.get(key, ())
+    ]
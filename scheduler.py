@@ -1,33 +1,58 @@
 """Планировщик: загрузка данных с API и ежедневные оповещения (через JobQueue бота)."""
 from datetime import datetime, time, timedelta
 import pytz
-from config import FETCH_TIMES, TIMEZONE
+from config import FETCH_TIMES, TIMEZONE, CHANGE_NOTIFY
 from database import (
-    replace_shifts,
-    get_users_with_notifications_enabled,
-    get_shifts_for_date,
-    was_notification_sent,
-    mark_notification_sent,
+    sync_shifts,
+    get_due_notifications,
+    enqueue_reminders,
+    purge_outbox,
 )
 from api_client import fetch_shifts_from_api
+from notify_schedule import schedule
+from roster import rebuild_roster
+from outbox import outbox
+from change_notify import notify_changes
+from metrics import SYNC_DELTA
 
 tz = pytz.timezone(TIMEZONE)
 NOTIFY_CUTOFF_HOUR = 18  # після 18:00 за локальним часом показуємо зміну на завтра
 
 
 async def job_fetch_shifts(context):
-    """Загрузить смены с API и записать в БД."""
-    rows = await fetch_shifts_from_api()
-    if rows:
-        await replace_shifts(rows)
-        print(f"[{datetime.now()}] Shifts updated: {len(rows)} rows")
-    else:
-        print(f"[{datetime.now()}] Shifts fetch returned nothing")
+    """Загрузить смены с API (страницами по окну дат) и применить к БД только разницу."""
+    fetch = fetch_shifts_from_api()
+    # ETag/Last-Modified пишуться в транзакції sync_shifts: при збої лишаються старі, наступний запит — повний
+    changes = await sync_shifts(fetch)
+    if not fetch.received:
+        print(
+            f"[{datetime.now()}] Shifts unchanged: pages {fetch.pages} (304: {fetch.not_modified}, "
+            f"errors: {fetch.failed}), sync skipped"
+        )
+        return
+    for kind in ("inserted", "updated", "deleted"):
+        SYNC_DELTA.observe(len(changes[kind]), kind)
+    if changes["version"] is not None:
+        roster = await rebuild_roster(changes["fios"])
+        print(
+            f"[{datetime.now()}] Roster snapshot v{roster.version}: {roster.rows} rows, "
+            f"{len(roster.fios)} fio, ~{roster.memory_bytes() / 1e6:.1f} MB"
+        )
+        # Перше наповнення таблиці — не «зміни», нікого не сповіщаємо
+        if CHANGE_NOTIFY and not changes["initial"]:
+            queued = await notify_changes(changes, datetime.now(tz).date().isoformat())
+            if queued:
+                print(f"[{datetime.now()}] Change notifications queued: {queued}")
+    print(
+        f"[{datetime.now()}] Shifts synced: pages {fetch.pages} (304: {fetch.not_modified}, errors: {fetch.failed}); "
+        f"+{len(changes['inserted'])} ~{len(changes['updated'])} -{len(changes['deleted'])}, "
+        f"{len(changes['fios'])} fio changed"
+    )
 
 
 async def job_send_notifications(context):
-    """Перевірити: кому зараз час нагадування — надіслати. Після 18:00 за локальним часом — зміна на завтра."""
-    bot = context.bot
+    """Раз на хвилину: надіслати нагадування користувачам з кошика поточної хвилини.
+    Після 18:00 за локальним часом — зміна на завтра. Порожній кошик — без звернень до БД."""
     now_local = datetime.now(tz)
     hour, minute = now_local.hour, now_local.minute
     if now_local.hour >= NOTIFY_CUTOFF_HOUR:
@@ -36,29 +61,28 @@ async def job_send_notifications(context):
     else:
         target_date = now_local
         day_label = "сьогодні"
+    if not schedule.users_at(hour, minute):
+        return
     target_ddmm = target_date.strftime("%d-%m-%Y")
-    users = await get_users_with_notifications_enabled()
-    for u in users:
-        u_hour = int(u.get("hour", 0) or 0)
-        u_minute = int(u.get("minute", 0) or 0)
-        if u_hour != hour or u_minute != minute:
-            continue
-        if await was_notification_sent(u["id"], target_ddmm):
-            continue
-        shifts_target = await get_shifts_for_date(target_ddmm)
-        my_shift = next((s for s in shifts_target if s["fio"] == u["fio"]), None)
-        if not my_shift:
-            continue
-        try:
-            text = (
-                f"Нагадування: {day_label} ({target_ddmm}) у вас зміна.\n"
-                f"зміна {my_shift['shift_type']}, місце: {my_shift['location']}."
-            )
-            await bot.send_message(chat_id=u["telegram_id"], text=text)
-            await mark_notification_sent(u["id"], target_ddmm)
-            print(f"[Notify] Надіслано {u['telegram_id']} на {target_ddmm}")
-        except Exception as e:
-            print(f"Notify error for {u['telegram_id']}: {e}")
+    due = await get_due_notifications(hour, minute, target_ddmm)
+    reminders = [
+        (
+            u["id"],
+            u["telegram_id"],
+            f"Нагадування: {day_label} ({target_ddmm}) у вас зміна.\n"
+            f"зміна {u['shift_type']}, місце: {u['location']}.",
+        )
+        for u in due
+    ]
+    # Відправку робить воркер outbox під спільним лімітом — пік о 08:00 розтягується, а не б'є в одну мить
+    if await enqueue_reminders(reminders, target_ddmm):
+        outbox.wake()
+        print(f"[Notify] У черзі {len(reminders)} нагадувань на {target_ddmm}")
+
+
+async def job_purge_outbox(context):
+    """Прибрати з черги старі надіслані повідомлення."""
+    await purge_outbox()
 
 
 def setup_jobs(application):
@@ -70,7 +94,10 @@ def setup_jobs(application):
     for t in FETCH_TIMES:
         h, m = map(int, t.split(":"))
         jq.run_daily(job_fetch_shifts, time=time(hour=h, minute=m, tzinfo=tz))
-    # Кожні 30 сек — перевірка сповіщень (щоб не пропустити хвилину)
-    jq.run_repeating(job_send_notifications, interval=30, first=10)
+    # Сповіщення — рівно на початку кожної хвилини (кошики індексу за хвилиною доби)
+    now = datetime.now(tz)
+    next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    jq.run_repeating(job_send_notifications, interval=60, first=next_minute)
+    jq.run_daily(job_purge_outbox, time=time(hour=3, minute=30, tzinfo=tz))
     # Одна загрузка при старте (через 2 сек)
     jq.run_once(job_fetch_shifts, when=2)
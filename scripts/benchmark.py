@@ -0,0 +1,854 @@
+"""Мікро-бенчмарки бота. Працюють на тимчасовій БД, реальну data/bot.db не чіпають.
+
+Запуск: python scripts/benchmark.py db | fetch | dates | menu | batch | webhook | updates | sync | keys | redeem | keygate | panel
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Тимчасова БД — до імпорту config, бо DB_PATH обчислюється при імпорті
+_tmpdir = tempfile.mkdtemp(prefix="tgbot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Локальний стаб EMS API для бенчмарку fetch
+_STUB_PORT = _free_port()
+os.environ["EMS_API_URL"] = f"http://127.0.0.1:{_STUB_PORT}"
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite
+import httpx
+import api_client
+import database
+import dates
+from config import DB_PATH
+
+
+def _report(label: str, samples: list[float]):
+    samples = sorted(samples)
+    n = len(samples)
+    avg = sum(samples) / n
+    p99 = samples[min(n - 1, int(n * 0.99))]
+    print(f"  {label:<28} avg {avg * 1e6:8.1f} µs   p99 {p99 * 1e6:8.1f} µs   ({n} запитів)")
+
+
+async def _activate_users(telegram_ids: list[int], phone: str | None = None) -> list[int]:
+    """Активувати користувачів, як у боті: по ключу на кожного через redeem_key. Повертає users.id."""
+    keys = [f"bench-{tid}" for tid in telegram_ids]
+    await database.add_keys_batch(keys, "bench")
+    uids = []
+    for tid, key in zip(telegram_ids, keys):
+        status, uid = await database.redeem_key(tid, key, phone)
+        assert status == "ok", f"redeem_key({tid}): {status}"
+        uids.append(uid)
+    return uids
+
+
+async def bench_db(n: int):
+    """Затримка запиту get_user_by_telegram_id: нове зʼєднання на кожен виклик vs спільний пул."""
+    await database.init_db()
+    await _activate_users([1001], phone="+380000000000")
+
+    async def fresh_connection_query():
+        # Так працювали всі хелпери до пулу: окремий connect на кожен запит
+        async with aiosqlite.connect(DB_PATH) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(
+                "SELECT id, telegram_id, key_id, fio, phone FROM users WHERE telegram_id = ?", (1001,)
+            )
+            return await cur.fetchone()
+
+    before = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        await fresh_connection_query()
+        before.append(time.perf_counter() - t0)
+
+    await database.open_db()
+    after = []
+    cached = []
+    try:
+        for _ in range(n):
+            database.user_cache.clear()
+            t0 = time.perf_counter()
+            await database.get_user_by_telegram_id(1001)
+            after.append(time.perf_counter() - t0)
+        for _ in range(n):
+            t0 = time.perf_counter()
+            await database.get_user_by_telegram_id(1001)
+            cached.append(time.perf_counter() - t0)
+    finally:
+        await database.close_db()
+
+    print(f"get_user_by_telegram_id, {n} послідовних запитів:")
+    _report("нове зʼєднання на запит", before)
+    _report("пул зʼєднань", after)
+    _report("пул + кеш профілів", cached)
+    print(f"  кеш профілів: {database.user_cache.stats()}")
+
+
+def _synthetic_roster(n: int, days: int = 180) -> list[dict]:
+    """n рядків змін: ~300 людей, дати dd-mm-yyyy від тижня тому на days днів уперед."""
+    start = date.today() - timedelta(days=7)
+    return [
+        {
+            "date_ddmm": (start + timedelta(days=i % days)).strftime("%d-%m-%Y"),
+            "fio": f"Працівник {i % 300:03d}",
+            "shift_type": "DNM"[i % 3],
+            "location": ("SK", "FD", "MT")[i % 3],
+        }
+        for i in range(n)
+    ]
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """GET /shifts[?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD] з ETag на кожне вікно."""
+
+    roster: list[dict] = []
+    payloads: dict[str, bytes] = {}
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def payload_for(cls, query: str) -> bytes:
+        with cls.lock:
+            if query not in cls.payloads:
+                params = parse_qs(query)
+                rows = cls.roster
+                if "date_from" in params:
+                    lo = date.fromisoformat(params["date_from"][0])
+                    hi = date.fromisoformat(params["date_to"][0])
+                    rows = [r for r in rows if lo <= datetime.strptime(r["date_ddmm"], "%d-%m-%Y").date() <= hi]
+                cls.payloads[query] = json.dumps(rows, ensure_ascii=False).encode()
+            return cls.payloads[query]
+
+    def do_GET(self):
+        query = urlsplit(self.path).query
+        payload = self.payload_for(query)
+        etag = f'"{hash(payload) & 0xFFFFFFFF:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.lock:
+            _StubHandler.bytes_sent += len(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def bench_fetch(n: int):
+    """Завантаження ростера з локального стабу: цілим і вікном по сторінках, повтор із 304,
+    для порівняння — старий буферизований спосіб (вся відповідь + resp.json())."""
+    await database.init_db()
+    _StubHandler.roster = _synthetic_roster(n)
+    server = ThreadingHTTPServer(("127.0.0.1", _STUB_PORT), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Ростер {n} рядків; RSS до старту {_peak_rss_mb():.0f} МБ")
+
+    async def run(label, coro_fn):
+        sent_before = _StubHandler.bytes_sent
+        t0 = time.perf_counter()
+        rows = await coro_fn()
+        elapsed = time.perf_counter() - t0
+        print(
+            f"  {label:<30} {elapsed * 1000:8.1f} мс   {(_StubHandler.bytes_sent - sent_before) / 1e6:6.2f} МБ   "
+            f"рядків: {rows:<7} пікова RSS {_peak_rss_mb():.0f} МБ"
+        )
+
+    async def streamed():
+        fetch = api_client.fetch_shifts_from_api()
+        rows = sum([len(chunk) async for chunk in fetch])
+        # У боті валідатори записує sync_shifts разом з даними; тут — лише вони, щоб повтор отримав 304
+        async with database._connect() as db:
+            await database._store_http_validators(db, fetch.validators)
+            await db.commit()
+        return rows
+
+    async def buffered():
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            resp = await client.get(f"{os.environ['EMS_API_URL']}/shifts")
+            return len([api_client._row_from_item(item) for item in resp.json()])
+
+    try:
+        api_client.FETCH_WINDOW_DAYS_AHEAD = 0
+        _StubHandler.payload_for("")
+        await run("цілим, потоково (200)", streamed)
+        await run("цілим, умовний повтор (304)", streamed)
+        api_client.FETCH_WINDOW_DAYS_AHEAD = 180
+        for window in api_client.fetch_windows():
+            _StubHandler.payload_for(f"date_from={window[0].isoformat()}&date_to={window[1].isoformat()}")
+        await run(f"вікном, {len(api_client.fetch_windows())} сторінок (200)", streamed)
+        await run("вікном, умовний повтор (304)", streamed)
+        await run("буферизований (200)", buffered)
+    finally:
+        await api_client.close_client()
+        server.shutdown()
+
+
+def _legacy_normalize(value: str) -> str:
+    """Нормалізація дати як до dates.py: до пʼяти нескомпільованих re.match і datetime.now() на рядок."""
+    import re
+    value = value.strip()
+    year = datetime.now().year
+    m = re.match(r"^(\d{1,2})-(\d{1,2})-(\d{4})$", value)
+    if m:
+        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{m.group(3)}"
+    m = re.match(r"^(\d{1,2})-(\d{1,2})$", value)
+    if m:
+        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{year}"
+    m = re.match(r"^(\d{4})-(\d{1,2})-(\d{1,2})", value)
+    if m:
+        return f"{int(m.group(3)):02d}-{int(m.group(2)):02d}-{m.group(1)}"
+    m = re.match(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?$", value)
+    if m:
+        y = m.group(3) if m.group(3) else str(year)
+        return f"{int(m.group(1)):02d}-{int(m.group(2)):02d}-{y}"
+    return value
+
+
+async def bench_dates(n: int):
+    """Нормалізація колонки дат синтетичного ростера (n рядків, змішані формати)."""
+    roster = _synthetic_roster(n)
+    formats = [
+        lambda d: d,  # dd-mm-yyyy
+        lambda d: d[:5],  # dd-mm
+        lambda d: f"{d[6:]}-{d[3:5]}-{d[:2]}",  # ISO
+        lambda d: d.replace("-", "."),  # dd.mm.yyyy
+    ]
+    column = [formats[i % len(formats)](r["date_ddmm"]) for i, r in enumerate(roster)]
+    print(f"Нормалізація {n} дат (4 формати, {len(set(column))} унікальних значень):")
+    for label, fn in [
+        ("двічі на рядок, без кешу", lambda: [_legacy_normalize(_legacy_normalize(v)) for v in column]),
+        ("dates.normalize_dates", lambda: dates.normalize_dates(column)),
+    ]:
+        dates._normalize.cache_clear()
+        t0 = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - t0
+        print(f"  {label:<28} {elapsed * 1000:8.1f} мс   ({n / elapsed / 1e6:.2f} млн рядків/с)")
+    assert out == [_legacy_normalize(v) for v in column]
+
+
+async def _seed_roster(n_rows: int, n_users: int) -> list[int]:
+    """Синтетичний ростер у БД + n_users активованих користувачів з ПІБ з ростера. Повертає їхні telegram_id."""
+    await database.init_db()
+    await database.sync_shifts(_synthetic_roster(n_rows))
+    fios = sorted({r["fio"] for r in _synthetic_roster(min(n_rows, 300))})
+    telegram_ids = [10_000 + i for i in range(n_users)]
+    for i, uid in enumerate(await _activate_users(telegram_ids)):
+        await database.set_user_fio(uid, fios[i % len(fios)])
+    return telegram_ids
+
+
+async def bench_menu(n: int):
+    """Сплеск n одночасних натискань «📅 Мої зміни»: профіль + рендер сторінки, без кешів і з кешами."""
+    from handlers import menu
+    import roster
+
+    await database.open_db()
+    try:
+        telegram_ids = await _seed_roster(50_000, min(n, 1000))
+
+        async def press(tid: int) -> float:
+            t0 = time.perf_counter()
+            db_user = await database.get_user_by_telegram_id(tid)
+            await menu.render_my_shifts(db_user["fio"], 0)
+            return time.perf_counter() - t0
+
+        async def burst(label: str, cold: bool):
+            if cold:
+                database.user_cache.clear()
+                menu.rendered_cache.clear()
+                await roster.rebuild_roster()
+            t0 = time.perf_counter()
+            samples = await asyncio.gather(*(press(telegram_ids[i % len(telegram_ids)]) for i in range(n)))
+            total = time.perf_counter() - t0
+            _report(label, list(samples))
+            print(f"  {'':<28} весь сплеск {total * 1000:.1f} мс")
+
+        print(f"Сплеск {n} натискань «📅 Мої зміни» ({len(telegram_ids)} користувачів):")
+        await burst("холодні кеші", cold=True)
+        await burst("теплі кеші", cold=False)
+        print(f"  кеш профілів: {database.user_cache.stats()}; кеш сторінок: {menu.rendered_cache.stats()}")
+    finally:
+        await database.close_db()
+
+
+def _legacy_push_batch_keyboard(users: list[dict], selected_ids: list[int]):
+    """Батч-вибір до компактних callback_data: усі N користувачів у кожній клавіатурі."""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    buttons = []
+    for u in users:
+        tid = u.get("telegram_id")
+        fio = (u.get("fio") or "—").strip() or "—"
+        label = ("✓ " if tid in selected_ids else "○ ") + f"{fio} ({tid})"[:55]
+        buttons.append([InlineKeyboardButton(label, callback_data=f"push_toggle:{tid}")])
+    buttons.append([InlineKeyboardButton("Готово — надіслати вибраним", callback_data="push_batch_done")])
+    buttons.append([InlineKeyboardButton("← Назад", callback_data="push_batch_back")])
+    return InlineKeyboardMarkup(buttons)
+
+
+async def bench_batch(n: int):
+    """Вибір усіх n одержувачів по одному: розмір edit-запиту і час обробки натискання, старий vs сторінковий."""
+    import keyboards
+
+    await database.open_db()
+    try:
+        await _seed_roster(5_000, n)
+        users = [{"telegram_id": tid, "fio": fio} for tid, fio in (await database.get_user_list())[1]]
+
+        def payload(markup) -> int:
+            return len(json.dumps(markup.to_dict(), ensure_ascii=False).encode())
+
+        old_samples, old_sizes, selected = [], [], []
+        for u in users:
+            t0 = time.perf_counter()
+            tid = u["telegram_id"]
+            selected = [x for x in selected if x != tid] if tid in selected else selected + [tid]
+            markup = _legacy_push_batch_keyboard(users, selected)
+            old_sizes.append(payload(markup))
+            old_samples.append(time.perf_counter() - t0)
+
+        new_samples, new_sizes, bits = [], [], 0
+        version, snapshot = await database.get_user_list()
+        for i in range(len(snapshot)):
+            t0 = time.perf_counter()
+            version, snapshot = await database.get_user_list()
+            bits ^= 1 << i
+            markup = keyboards.push_batch_keyboard(version, snapshot, bits, i // keyboards.PUSH_PAGE_SIZE)
+            new_sizes.append(payload(markup))
+            new_samples.append(time.perf_counter() - t0)
+        assert bits.bit_count() == len(selected) == len(users)
+
+        print(f"Батч-вибір {len(users)} одержувачів (по одному натисканню на кожного):")
+        _report("старий (N кнопок)", old_samples)
+        _report("сторінковий (бітова маска)", new_samples)
+        print(f"  розмір reply_markup: старий до {max(old_sizes) / 1024:.1f} КБ, сторінковий до {max(new_sizes)} Б")
+        print(f"  сумарно на весь вибір: {sum(old_samples):.2f} с vs {sum(new_samples) * 1000:.1f} мс")
+    finally:
+        await database.close_db()
+
+
+class _StubTelegram:
+    """Замість api.telegram.org: getMe та sendMessage відповідають одразу, час відповіді фіксується по chat_id."""
+
+    def __init__(self, latency: float = 0.0):
+        from telegram.request import BaseRequest
+
+        stub = self
+        self.latency = latency  # імітація RTT до Bot API
+        self.replies: dict[int, float] = {}
+        self.sent: dict[int, list[str]] = {}
+        self.waiters: dict[int, asyncio.Future] = {}
+
+        class Request(BaseRequest):
+            async def initialize(self):
+                pass
+
+            async def shutdown(self):
+                pass
+
+            async def do_request(self, url, method, request_data=None, **kwargs):
+                if stub.latency:
+                    await asyncio.sleep(stub.latency)
+                return 200, json.dumps({"ok": True, "result": stub.answer(url, request_data)}).encode()
+
+        self.request = Request()
+
+    def answer(self, url: str, request_data):
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        params = request_data.parameters if request_data else {}
+        chat_id = int(params.get("chat_id", 0))
+        if endpoint == "sendMessage":
+            self.replies.setdefault(chat_id, time.perf_counter())
+            self.sent.setdefault(chat_id, []).append(params.get("text", ""))
+            waiter = self.waiters.get(chat_id)
+            if waiter and not waiter.done():
+                waiter.set_result(None)
+            return {"message_id": 1, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"},
+                    "text": params.get("text", "")}
+        return True
+
+
+def _text_update(update_id: int, telegram_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": {"id": telegram_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        },
+    }
+
+
+def _bench_app(stub: _StubTelegram, concurrent_updates):
+    """Application з усіма обробниками бота, але з фейковим Bot API."""
+    from telegram.ext import Application
+    from handlers import setup_handlers
+
+    app = (
+        Application.builder()
+        .token("123:bench")
+        .request(stub.request)
+        .get_updates_request(stub.request)
+        .concurrent_updates(concurrent_updates)
+        .build()
+    )
+    setup_handlers(app)
+    return app
+
+
+async def bench_webhook(n: int):
+    """Навантаження на webhook без Telegram: n одночасних POST «📅 Мої зміни» через ASGI-застосунок,
+    пропускна здатність і затримка від POST до відповіді бота (sendMessage)."""
+    from config import UPDATE_CONCURRENCY, UPDATE_MAX_PENDING
+    from update_processor import ChatOrderedUpdateProcessor
+    from webhook import WebhookApp
+
+    await database.open_db()
+    stub = _StubTelegram()
+    app = _bench_app(stub, ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING))
+    try:
+        telegram_ids = await _seed_roster(50_000, min(n, 1000))
+        await app.initialize()
+        await app.start()
+        server = WebhookApp(app, path="/telegram", secret="bench-secret")
+        headers = {"X-Telegram-Bot-Api-Secret-Token": "bench-secret"}
+        transport = httpx.ASGITransport(app=server)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            forbidden = await client.post("/telegram", json=_text_update(0, 1, "x"))
+            assert forbidden.status_code == 403
+
+            loop = asyncio.get_running_loop()
+            ack, e2e = [], []
+
+            async def press(i: int):
+                # Унікальний chat_id на запит — щоб відповідь однозначно зіставлялась з POST
+                tid = telegram_ids[i % len(telegram_ids)]
+                chat_id = 1_000_000 + i
+                body = _text_update(i + 1, tid, "📅 Мої зміни")
+                body["message"]["chat"]["id"] = chat_id
+                stub.waiters[chat_id] = loop.create_future()
+                t0 = time.perf_counter()
+                resp = await client.post("/telegram", json=body, headers=headers)
+                ack.append(time.perf_counter() - t0)
+                assert resp.status_code == 200, resp.text
+                await stub.waiters[chat_id]
+                e2e.append(stub.replies[chat_id] - t0)
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(press(i) for i in range(n)))
+            total = time.perf_counter() - t0
+            health = (await client.get("/healthz")).json()
+
+        print(f"Webhook: {n} одночасних оновлень, UPDATE_CONCURRENCY={UPDATE_CONCURRENCY}:")
+        _report("POST → 200 (ack)", ack)
+        _report("POST → sendMessage", e2e)
+        print(f"  пропускна здатність {n / total:.0f} оновлень/с; healthz: {health}")
+    finally:
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        await database.close_db()
+
+
+async def bench_updates(n: int):
+    """Сплеск n користувачів, що одночасно тиснуть «📅 Мої зміни» (RTT до Bot API ~50 мс):
+    послідовна обробка PTB за замовчуванням vs ChatOrderedUpdateProcessor; плюс перевірка порядку в чаті."""
+    from telegram import Update
+    from config import UPDATE_CONCURRENCY, UPDATE_MAX_PENDING
+    from handlers import menu
+    from update_processor import ChatOrderedUpdateProcessor
+    import keyboards
+    import roster
+
+    await database.open_db()
+    try:
+        telegram_ids = await _seed_roster(50_000, min(n, 1000))
+
+        async def burst(label: str, concurrent_updates):
+            database.user_cache.clear()
+            menu.rendered_cache.clear()
+            await roster.rebuild_roster()
+            stub = _StubTelegram(latency=0.05)
+            app = _bench_app(stub, concurrent_updates)
+            await app.initialize()
+            await app.start()
+            try:
+                loop = asyncio.get_running_loop()
+                t0 = time.perf_counter()
+                for i in range(n):
+                    tid = telegram_ids[i % len(telegram_ids)]
+                    stub.waiters[tid] = stub.waiters.get(tid) or loop.create_future()
+                    update = Update.de_json(_text_update(i + 1, tid, "📅 Мої зміни"), app.bot)
+                    await app.update_queue.put(update)
+                await asyncio.gather(*stub.waiters.values())
+                first_reply = [stub.replies[tid] - t0 for tid in stub.waiters]
+                # Перша відповідь у чаті — ще не кінець сплеску: чекаємо відповіді на кожне з n оновлень
+                while sum(map(len, stub.sent.values())) < n:
+                    await asyncio.sleep(0.01)
+                total = time.perf_counter() - t0
+
+                # Порядок у межах чату: три оновлення поспіль від кожного з перших 50 користувачів
+                sequence = [keyboards.BTN_MY_SHIFTS, keyboards.BTN_NOTIFICATIONS, keyboards.BTN_MY_SHIFTS]
+                stub.sent.clear()
+                checked = telegram_ids[:50]
+                for k, text in enumerate(sequence):
+                    for tid in checked:
+                        await app.update_queue.put(Update.de_json(_text_update(n + k * 100 + 1, tid, text), app.bot))
+                while sum(len(stub.sent.get(tid, ())) for tid in checked) < len(checked) * len(sequence):
+                    await asyncio.sleep(0.01)
+                in_order = all("сповіщення" in stub.sent[tid][1].lower() for tid in checked)
+            finally:
+                await app.stop()
+                await app.shutdown()
+            _report(label, first_reply)
+            print(f"  {'':<28} весь сплеск {total:.2f} с; порядок у чаті збережено: {in_order}")
+
+        print(f"Сплеск {n} натискань «📅 Мої зміни» ({len(telegram_ids)} користувачів), RTT Bot API 50 мс:")
+        await burst("послідовно (за замовч. PTB)", False)
+        await burst(f"паралельно ({UPDATE_CONCURRENCY}, по чатах)", ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING))
+    finally:
+        await database.close_db()
+
+
+def _unique_roster(n: int, days: int = 180) -> list[dict]:
+    """n унікальних рядків (date, fio): n / days людей, у кожного зміна щодня."""
+    start = date.today() - timedelta(days=7)
+    return [
+        {
+            "date_ddmm": (start + timedelta(days=i % days)).strftime("%d-%m-%Y"),
+            "fio": f"Працівник {i // days:04d}",
+            "shift_type": "DNM"[i % 3],
+            "location": ("SK", "FD", "MT")[(i // 7) % 3],
+        }
+        for i in range(n)
+    ]
+
+
+class _FetchedRows(list):
+    """Рядки з атрибутами ShiftFetch: scope (дати отриманих сторінок) і received (сторінок з 200)."""
+
+    def __init__(self, rows, scope: set[str], received: int):
+        super().__init__(rows)
+        self.scope = scope
+        self.received = received
+
+
+async def bench_sync(n: int):
+    """Синхронізація ростера n рядків: без змін і з ~1% змін, плюс розсилка дельт по ПІБ (change_notify)."""
+    import random
+    import change_notify
+
+    await database.open_db()
+    try:
+        await database.init_db()
+        rows = _unique_roster(n)
+        t0 = time.perf_counter()
+        await database.sync_shifts(rows)
+        print(f"Синхронізація {len(rows)} рядків:")
+        print(f"  {'перше наповнення':<28} {(time.perf_counter() - t0) * 1000:8.1f} мс")
+        fios = sorted({r["fio"] for r in rows})
+        for fio, uid in zip(fios, await _activate_users([50_000 + i for i in range(len(fios))])):
+            await database.set_user_fio(uid, fio)
+            await database.set_notification_settings(uid, 8, 0, 1)
+
+        t0 = time.perf_counter()
+        changes = await database.sync_shifts(rows)
+        print(f"  {'без змін':<28} {(time.perf_counter() - t0) * 1000:8.1f} мс")
+
+        changed = [dict(r) for r in rows]
+        rng = random.Random(1)
+        for r in rng.sample(changed, len(changed) // 200):
+            r["location"] = "NEW"
+        del changed[: len(changed) // 400]
+        changed += [dict(r, date_ddmm=(date.today() + timedelta(days=200)).strftime("%d-%m-%Y")) for r in rows[:: len(rows) // 100 or 1]]
+        t0 = time.perf_counter()
+        changes = await database.sync_shifts(changed)
+        sync_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        queued = await change_notify.notify_changes(changes, date.today().isoformat())
+        notify_ms = (time.perf_counter() - t0) * 1000
+        print(
+            f"  {'~1% змін':<28} {sync_ms:8.1f} мс   (+{len(changes['inserted'])} "
+            f"~{len(changes['updated'])} -{len(changes['deleted'])}, {len(changes['fios'])} ПІБ)"
+        )
+        print(f"  {'дельти в outbox':<28} {notify_ms:8.1f} мс   ({queued} повідомлень для {len(fios)} підписників)")
+
+        t0 = time.perf_counter()
+        await database.sync_shifts(_FetchedRows([], set(), received=0))
+        print(f"  {'усі сторінки 304':<28} {(time.perf_counter() - t0) * 1000:8.1f} мс")
+        window = {(date.today() + timedelta(days=d)).strftime("%d-%m-%Y") for d in range(14)}
+        page = [r for r in changed if r["date_ddmm"] in window]
+        t0 = time.perf_counter()
+        changes = await database.sync_shifts(_FetchedRows(page, window, received=1))
+        print(
+            f"  {'вікно 14 днів, без змін':<28} {(time.perf_counter() - t0) * 1000:8.1f} мс   "
+            f"({len(page)} рядків, -{len(changes['deleted'])})"
+        )
+    finally:
+        await database.close_db()
+
+
+async def _legacy_add_keys(keys: list[str]):
+    """Як було: окремий INSERT OR IGNORE на кожен ключ."""
+    async with database._connect() as db:
+        for k in keys:
+            await db.execute(
+                "INSERT OR IGNORE INTO activation_keys (key_text, used, created_at) VALUES (?, 0, ?)",
+                (k.strip(), "2026-01-01T00:00:00"),
+            )
+        await db.commit()
+
+
+async def bench_keys(n: int):
+    """Генерація n ключів: поштучний INSERT проти add_keys_batch частинами; імпорт з 10% дублікатів."""
+    import generate_keys
+
+    await database.open_db()
+    try:
+        await database.init_db()
+        legacy_n = min(n, 20_000)
+        keys = generate_keys.generate_keys(legacy_n)
+        t0 = time.perf_counter()
+        await _legacy_add_keys(keys)
+        elapsed = time.perf_counter() - t0
+        print("Ключі активації:")
+        print(f"  {'поштучно (' + str(legacy_n) + ')':<28} {legacy_n / elapsed:10.0f} ключів/с")
+
+        path = os.path.join(_tmpdir, "keys.txt")
+        with open(path, "w", encoding="utf-8") as out:
+            progress = await generate_keys.generate(n, out, "bench", None)
+        print(f"  {'генерація (' + str(n) + ')':<28} {progress.rate:10.0f} ключів/с   ({progress.elapsed:.2f} с, пік RSS {_peak_rss_mb():.0f} МБ)")
+
+        with open(path, encoding="utf-8") as f:
+            existing = [line.strip() for _, line in zip(range(n // 10), f)]
+        with open(path + ".import", "w", encoding="utf-8") as f:
+            for i, key in enumerate(generate_keys.generate_keys(n - len(existing))):
+                f.write(key + "\n")
+                if i % 9 == 0 and existing:
+                    f.write(existing.pop() + "\n")
+            f.write("\n".join(existing) + "\n")
+        with open(path + ".import", encoding="utf-8") as f:
+            progress = await generate_keys.import_keys(f, "bench-import", None)
+        print(f"  {'імпорт (' + str(progress.added + progress.duplicates) + ')':<28} {progress.rate:10.0f} ключів/с   ({progress.duplicates} дублікатів)")
+    finally:
+        await database.close_db()
+
+
+async def _legacy_redeem(telegram_id: int, key_text: str) -> bool:
+    """Як було в key_input: знайти ключ, створити користувача, позначити ключ — три окремі транзакції."""
+    async with database._connect() as db:
+        cur = await db.execute("SELECT id, used FROM activation_keys WHERE key_text = ?", (key_text,))
+        key = await cur.fetchone()
+    if not key or key[1]:
+        return False
+    async with database._connect() as db:
+        await db.execute("INSERT INTO users (telegram_id, key_id, phone) VALUES (?, ?, '')", (telegram_id, key[0]))
+        await db.commit()
+    async with database._connect() as db:
+        await db.execute("UPDATE activation_keys SET used = 1 WHERE id = ?", (key[0],))
+        await db.commit()
+    return True
+
+
+async def bench_redeem(n: int):
+    """n паралельних активацій на пул із n / 20 ключів: скільки ключів витрачено двічі і яка пропускна здатність."""
+    import random
+    import generate_keys
+
+    await database.open_db()
+    try:
+        await database.init_db()
+        rng = random.Random(1)
+        pool_size = max(1, n // 20)
+        print(f"{n} паралельних активацій, пул {pool_size} ключів:")
+
+        async def run(label: str, redeem, base_tid: int):
+            keys = generate_keys.generate_keys(pool_size)
+            await database.add_keys_batch(keys)
+            attempts = [(base_tid + i, rng.choice(keys)) for i in range(n)]
+            t0 = time.perf_counter()
+            results = await asyncio.gather(*(redeem(tid, key) for tid, key in attempts))
+            elapsed = time.perf_counter() - t0
+            async with database._connect() as db:
+                cur = await db.execute(
+                    """SELECT COUNT(*) FROM (
+                           SELECT key_id FROM users WHERE telegram_id >= ? AND telegram_id < ?
+                           GROUP BY key_id HAVING COUNT(*) > 1)""",
+                    (base_tid, base_tid + n),
+                )
+                double_spent = (await cur.fetchone())[0]
+            ok = sum(1 for r in results if r is True or (isinstance(r, tuple) and r[0] == "ok"))
+            print(f"  {label:<28} {n / elapsed:8.0f} спроб/с   активовано {ok}, витрачено двічі: {double_spent}")
+            return double_spent
+
+        await run("3 окремі транзакції (було)", _legacy_redeem, 1_000_000)
+        double_spent = await run("redeem_key", database.redeem_key, 2_000_000)
+        assert double_spent == 0, f"redeem_key: {double_spent} ключів витрачено двічі"
+    finally:
+        await database.close_db()
+
+
+async def bench_keygate(n: int):
+    """Спам невірними ключами: redeem_key (запит до БД) проти фільтра Блума; памʼять і частка хибних збігів."""
+    import generate_keys
+    from key_gate import KeyFilter, AttemptLimiter
+
+    await database.open_db()
+    try:
+        await database.init_db()
+        path = os.path.join(_tmpdir, "keys.txt")
+        with open(path, "w", encoding="utf-8") as out:
+            await generate_keys.generate(n, out, "bench", None)
+        key_filter = KeyFilter()
+        t0 = time.perf_counter()
+        await key_filter.load()
+        print(f"Фільтр на {n} ключів: {key_filter._bloom.__sizeof__() / 1024:.0f} КБ, побудова {(time.perf_counter() - t0) * 1000:.0f} мс")
+
+        spam = [f"wrong-{i:010d}" for i in range(n)]
+        probe = spam[:10_000]
+        t0 = time.perf_counter()
+        for key in probe:
+            await database.redeem_key(1, key)
+        db_rate = len(probe) / (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        passed = 0
+        for key in spam:
+            passed += await key_filter.might_exist(key)
+        filter_rate = len(spam) / (time.perf_counter() - t0)
+        print(f"  {'redeem_key (БД)':<28} {db_rate:10.0f} невірних ключів/с")
+        print(f"  {'фільтр':<28} {filter_rate:10.0f} невірних ключів/с   (до БД дійшло {passed / len(spam):.2%})")
+
+        limiter = AttemptLimiter(limit=5, window=600)
+        t0 = time.perf_counter()
+        allowed = sum(not limiter.hit(i % 1000) for i in range(n))
+        print(f"  {'ліміт спроб (1000 акаунтів)':<28} {n / (time.perf_counter() - t0):10.0f} спроб/с     пропущено {allowed} з {n}")
+    finally:
+        await database.close_db()
+
+
+class _DocumentSink:
+    """Замість бота для export_csv: рахує байти вивантаженого файлу."""
+
+    def __init__(self):
+        self.size = 0
+
+    async def send_document(self, chat_id, document, filename, caption=None):
+        while chunk := document.read(1 << 16):
+            self.size += len(chunk)
+
+    async def send_message(self, chat_id, text):
+        print(f"  помилка експорту: {text}")
+
+
+async def bench_panel(n: int):
+    """Адмін-панель на n користувачах: вивантаження CSV (пік RSS — до повного списку), повний список
+    одним повідомленням (було) проти сторінки за id, пошук по індексах."""
+    from handlers import admin_push
+
+    await database.open_db()
+    try:
+        await database.init_db()
+        async with database._connect() as db:
+            await db.executemany(
+                "INSERT INTO users (telegram_id, key_id, fio, fio_key, phone) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (100_000 + i, i + 1, f"Працівник {i:06d}", f"працівник {i:06d}", f"+380{500000000 + i}")
+                    for i in range(n)
+                ],
+            )
+            await db.commit()
+        print(f"Адмін-панель, {n} користувачів:")
+
+        sink = _DocumentSink()
+        t0 = time.perf_counter()
+        await admin_push.export_csv(sink, 1, "users")
+        print(
+            f"  {'CSV усіх користувачів':<28} {(time.perf_counter() - t0) * 1000:8.1f} мс   "
+            f"{sink.size / 1024:.0f} КБ, пік RSS {_peak_rss_mb():.0f} МБ"
+        )
+
+        t0 = time.perf_counter()
+        users, _, _ = await database.get_users_page(limit=n)
+        text = "\n".join(["📋 Хто в боті:\n"] + [admin_push._user_line(u) for u in users])
+        print(f"  {'весь список (було)':<28} {(time.perf_counter() - t0) * 1000:8.1f} мс   {len(text)} символів (ліміт Telegram 4096)")
+        del users, text
+
+        for label, kwargs in (("перша сторінка", {}), ("сторінка з середини", {"after_id": n // 2}), ("← з середини", {"before_id": n // 2})):
+            t0 = time.perf_counter()
+            for _ in range(100):
+                text, _ = await admin_push.users_page_view(**kwargs)
+            print(f"  {label:<28} {(time.perf_counter() - t0) * 10:8.2f} мс   {len(text)} символів")
+
+        for label, query in (("пошук за ПІБ", "працівник 0123"), ("пошук за телефоном", "0500099"), ("пошук за telegram_id", str(100_000 + n // 3))):
+            t0 = time.perf_counter()
+            for _ in range(100):
+                found = await database.search_users(query, admin_push.SEARCH_LIMIT)
+            print(f"  {label:<28} {(time.perf_counter() - t0) * 10:8.2f} мс   знайдено {len(found)}")
+
+    finally:
+        await database.close_db()
+
+
+BENCHMARKS = {
+    "db": bench_db,
+    "fetch": bench_fetch,
+    "dates": bench_dates,
+    "menu": bench_menu,
+    "batch": bench_batch,
+    "webhook": bench_webhook,
+    "updates": bench_updates,
+    "sync": bench_sync,
+    "keys": bench_keys,
+    "redeem": bench_redeem,
+    "keygate": bench_keygate,
+    "panel": bench_panel,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("-n", type=int, default=1000, help="кількість ітерацій")
+    args = parser.parse_args()
+    asyncio.run(BENCHMARKS[args.name](args.n))
+
+
+if __name__ == "__main__":
+    main()
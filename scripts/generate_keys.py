@@ -1,39 +1,177 @@
-"""Генерация 50 одноразовых ключей активации. Результат — в data/keys.txt и в БД."""
+"""Генерація та імпорт одноразових ключів активації.
+
+    python scripts/generate_keys.py                      # 50 нових ключів → БД і data/keys.txt
+    python scripts/generate_keys.py -n 1000000 -o data/keys-oct.txt --batch oct --expires 2026-12-31
+    python scripts/generate_keys.py --import old_keys.txt --batch legacy --duplicates data/dups.txt
+
+Ключі пишуться в БД частинами (--chunk, одна транзакція на частину), файл виводу дописується
+по ходу — весь набір у памʼяті не тримається. Дублікати (вже є в БД або повтор у файлі імпорту)
+не додаються: при генерації замінюються новими, при імпорті — рахуються і пишуться в --duplicates.
+"""
+import argparse
 import asyncio
-import secrets
 import os
+import secrets
 import sys
+import time
+from datetime import date, datetime, timezone
 
 # Добавляем корень проекта в путь
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config import PROJECT_ROOT
 from database import init_db, add_keys_batch
 
 KEY_LENGTH = 16  # символов
 KEY_COUNT = 50
+CHUNK_SIZE = 10_000
+PROGRESS_EVERY = 100_000
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, "data", "keys.txt")
 
 
-def generate_keys(n: int = KEY_COUNT) -> list[str]:
-    """Сгенерировать n уникальных ключей (буквы и цифры)."""
+def generate_keys(n: int = KEY_COUNT, length: int = KEY_LENGTH) -> list[str]:
+    """Сгенерировать n уникальных ключей (hex)."""
     keys = set()
     while len(keys) < n:
-        keys.add(secrets.token_hex(KEY_LENGTH // 2)[:KEY_LENGTH])
+        keys.add(secrets.token_hex((length + 1) // 2)[:length])
     return list(keys)
 
 
+def _chunks(lines, size: int):
+    """Непорожні рядки файлу імпорту частинами по size."""
+    chunk = []
+    for line in lines:
+        key = line.strip()
+        if not key:
+            continue
+        chunk.append(key)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Progress:
+    def __init__(self, total: int | None = None):
+        self.total = total
+        self.started = time.perf_counter()
+        self.added = 0
+        self.duplicates = 0
+        self._next = PROGRESS_EVERY
+
+    def update(self, added: int, duplicates: int):
+        self.added += added
+        self.duplicates += duplicates
+        if self.added >= self._next:
+            self._next += PROGRESS_EVERY
+            of = f"/{self.total}" if self.total else ""
+            print(f"  … {self.added}{of} ({self.rate:.0f} ключів/с)", file=sys.stderr)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.added / self.elapsed if self.elapsed else 0.0
+
+
+async def generate(count: int, out, batch_id: str, expires_at: str | None,
+                   chunk_size: int = CHUNK_SIZE, length: int = KEY_LENGTH) -> _Progress:
+    """Додати count нових ключів; кожну збережену частину одразу дописати в out (якщо є)."""
+    progress = _Progress(count)
+    while progress.added < count:
+        keys = generate_keys(min(chunk_size, count - progress.added), length)
+        duplicates = set(await add_keys_batch(keys, batch_id, expires_at))
+        added = [k for k in keys if k not in duplicates]
+        if out and added:
+            out.write("\n".join(added) + "\n")
+        progress.update(len(added), len(duplicates))
+    return progress
+
+
+async def import_keys(lines, batch_id: str, expires_at: str | None,
+                      chunk_size: int = CHUNK_SIZE, dup_out=None) -> _Progress:
+    """Імпортувати ключі з ітератора рядків; дублікати — в dup_out (якщо є)."""
+    progress = _Progress()
+    for chunk in _chunks(lines, chunk_size):
+        duplicates = await add_keys_batch(chunk, batch_id, expires_at)
+        if dup_out and duplicates:
+            dup_out.write("\n".join(duplicates) + "\n")
+        progress.update(len(chunk) - len(duplicates), len(duplicates))
+    return progress
+
+
+def _expires_at(value: str | None) -> str | None:
+    """YYYY-MM-DD → кінець цього дня (UTC) у форматі, який порівнюється з datetime('now') SQLite."""
+    if not value:
+        return None
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        raise SystemExit(f"--expires: очікується дата YYYY-MM-DD, отримано {value!r}")
+    return f"{day.isoformat()} 23:59:59"
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--count", type=int, default=KEY_COUNT, help="скільки ключів згенерувати")
+    parser.add_argument("--length", type=int, default=KEY_LENGTH, help="довжина ключа (символів)")
+    parser.add_argument("--import", dest="import_path", help="імпортувати ключі з файлу (по одному в рядку; - = stdin)")
+    parser.add_argument("-o", "--output", help=f"куди писати нові ключі (за замовчуванням при генерації {DEFAULT_OUTPUT})")
+    parser.add_argument("--append", action="store_true", help="дописувати у файл виводу, а не перезаписувати")
+    parser.add_argument("--duplicates", help="файл для дублікатів при імпорті")
+    parser.add_argument("--batch", help="ідентифікатор партії (за замовчуванням — час запуску UTC)")
+    parser.add_argument("--expires", help="останній день дії ключів, YYYY-MM-DD (UTC)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="ключів на транзакцію")
+    return parser.parse_args()
+
+
+def _open_text(path: str | None, mode: str):
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return open(path, mode, encoding="utf-8")
+
+
 async def main():
+    args = _parse_args()
+    batch_id = args.batch or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    expires_at = _expires_at(args.expires)
+    chunk_size = max(1, args.chunk)
     await init_db()
-    keys = generate_keys(KEY_COUNT)
-    await add_keys_batch(keys)
-    os.makedirs("data", exist_ok=True)
-    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "keys.txt")
-    with open(path, "w", encoding="utf-8") as f:
-        for k in keys:
-            f.write(k + "\n")
-    print(f"Создано {len(keys)} ключей. Файл: {path}")
-    print("Примеры (первые 3):")
-    for k in keys[:3]:
-        print(f"  {k}")
+
+    if args.import_path:
+        source = sys.stdin if args.import_path == "-" else open(args.import_path, encoding="utf-8")
+        dup_out = _open_text(args.duplicates, "a" if args.append else "w")
+        try:
+            progress = await import_keys(source, batch_id, expires_at, chunk_size, dup_out)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if dup_out:
+                dup_out.close()
+        print(
+            f"Імпортовано {progress.added} ключів (партія {batch_id}) за {progress.elapsed:.1f} с "
+            f"({progress.rate:.0f} ключів/с). Дублікатів пропущено: {progress.duplicates}."
+        )
+        if progress.duplicates and args.duplicates:
+            print(f"Дублікати: {args.duplicates}")
+        return
+
+    path = args.output or DEFAULT_OUTPUT
+    out = _open_text(path, "a" if args.append else "w")
+    try:
+        progress = await generate(args.count, out, batch_id, expires_at, chunk_size, args.length)
+    finally:
+        out.close()
+    print(
+        f"Створено {progress.added} ключів (партія {batch_id}) за {progress.elapsed:.1f} с "
+        f"({progress.rate:.0f} ключів/с). Файл: {path}"
+    )
+    if progress.duplicates:
+        print(f"Колізій з наявними ключами: {progress.duplicates} (замінено новими)")
 
 
 if __name__ == "__main__":
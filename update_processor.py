@@ -0,0 +1,58 @@
+"""Паралельна обробка оновлень зі збереженням порядку в межах одного чату.
+
+Різні чати обробляються одночасно (не більше max_concurrent), оновлення одного чату —
+строго по черзі, в порядку надходження: контакт → ключ → ПІБ не переплутаються.
+"""
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """max_pending — скільки оновлень може бути в роботі та в очікуванні (семафор PTB),
+    max_concurrent — скільки з них реально виконується. Слот займається лише після черги свого
+    чату, тож користувач, що надіслав багато повідомлень поспіль, не забирає слоти в інших."""
+
+    def __init__(self, max_concurrent: int, max_pending: int | None = None):
+        super().__init__(max_concurrent_updates=max(max_pending or 0, max_concurrent))
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._chats: dict[int, list] = {}  # chat_id -> [Lock, скільки оновлень чату в роботі]
+
+    async def do_process_update(self, update, coroutine):
+        key = _chat_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def __len__(self):
+        """Скільки чатів зараз мають оновлення в роботі."""
+        return len(self._chats)
+
+
+def _chat_key(update) -> int | None:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
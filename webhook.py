@@ -0,0 +1,138 @@
+"""Режим webhook: мінімальний ASGI-застосунок + uvicorn (необовʼязкова залежність, pip install uvicorn).
+
+POST WEBHOOK_PATH — оновлення від Telegram (перевіряється X-Telegram-Bot-Api-Secret-Token),
+кладеться в чергу Application і одразу отримує 200; GET /healthz — стан для балансувальника/моніторингу.
+"""
+import hmac
+import json
+import time
+from telegram import Update
+from telegram.ext import Application
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+)
+
+HEALTH_PATH = "/healthz"
+MAX_BODY_BYTES = 1024 * 1024
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+
+class WebhookApp:
+    """ASGI-застосунок без фреймворку: два маршрути, тіло читається повністю (оновлення малі)."""
+
+    def __init__(self, application: Application, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET):
+        self.application = application
+        self.path = path
+        self.secret = secret.encode()
+        self.started = time.monotonic()
+        self.received = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        path, method = scope["path"], scope["method"]
+        if path == HEALTH_PATH and method in ("GET", "HEAD"):
+            await self._health(send)
+        elif path != self.path:
+            await _respond(send, 404, b"not found")
+        elif method != "POST":
+            await _respond(send, 405, b"method not allowed")
+        else:
+            await self._update(scope, receive, send)
+
+    async def _update(self, scope, receive, send):
+        if self.secret:
+            token = dict(scope["headers"]).get(SECRET_HEADER, b"")
+            if not hmac.compare_digest(token, self.secret):
+                self.rejected += 1
+                await _respond(send, 403, b"forbidden")
+                return
+        body = await _read_body(receive)
+        if body is None:
+            await _respond(send, 413, b"too large")
+            return
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            await _respond(send, 400, b"bad update")
+            return
+        self.received += 1
+        await self.application.update_queue.put(update)
+        await _respond(send, 200, b"ok")
+
+    async def _health(self, send):
+        running = self.application.running
+        payload = {
+            "status": "ok" if running else "starting",
+            "uptime_s": round(time.monotonic() - self.started),
+            "updates": self.received,
+            "rejected": self.rejected,
+            "queue": self.application.update_queue.qsize(),
+        }
+        await _respond(send, 200 if running else 503, json.dumps(payload).encode(), b"application/json")
+
+
+async def _read_body(receive) -> bytes | None:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _respond(send, status: int, body: bytes, content_type: bytes = b"text/plain"):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def run_webhook(application: Application):
+    """Повний життєвий цикл у режимі webhook: ті ж post_init/post_shutdown, що й у run_polling."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("BOT_MODE=webhook потребує uvicorn: pip install uvicorn")
+    if not WEBHOOK_URL:
+        raise SystemExit("BOT_MODE=webhook: вкажіть WEBHOOK_URL у .env")
+    server = uvicorn.Server(uvicorn.Config(
+        WebhookApp(application),
+        host=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        lifespan="off",
+        log_level="warning",
+    ))
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True,
+        )
+        await application.start()
+        print(f"Webhook: {WEBHOOK_URL}{WEBHOOK_PATH} → {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+        try:
+            await server.serve()
+        finally:
+            await application.stop()
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)